@@ -0,0 +1,144 @@
+# Micro-benchmark and equivalence check for clean_pdf_text.
+#
+# Compares the single-pass normalizer (and its incremental TextNormalizer form,
+# fed page by page and in random piece sizes) against the original chained-regex
+# function. The check always covers the extracted-text fixtures in
+# benchmarks/fixtures: PyPDF2 page texts of small meeting-notes, memo and
+# brainstorm-board PDFs with list markers on their own lines, tabs, no-break
+# spaces, form feeds and empty pages, plus the cleaned text each should give.
+# A randomized corpus and the text of any PDFs passed on the command line are
+# checked as well. Any mismatch exits with an error.
+#
+#   python benchmarks/bench_clean_pdf_text.py [--pdf path/to/notes.pdf ...] [--cases 2000]
+#   python benchmarks/bench_clean_pdf_text.py --check          # equivalence only, no timings
+#   python benchmarks/bench_clean_pdf_text.py --update-fixtures  # re-extract the fixture PDFs
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyPDF2 import PdfReader
+from brainstorm_buddy.extraction import TextNormalizer, clean_pdf_text, iter_pdf_pages
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# The original implementation, kept as the reference
+def legacy_clean_pdf_text(text):
+    text = re.sub(r'(\d+\.\n)', r'\1__PRESERVE_NEWLINE__', text)
+    text = re.sub(r'(●\n)', r'\1__PRESERVE_NEWLINE__', text)
+    text = re.sub(r'(○\n)', r'\1__PRESERVE_NEWLINE__', text)
+    text = re.sub(r'\n+', ' ', text)
+    text = text.replace('__PRESERVE_NEWLINE__', '\n')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+# Fragments seen in PDF extractions, plus the placeholder and pieces of it
+FRAGMENTS = [
+    "Soap", "marketing", "Q3", "budget", "1.", "12.", "●", "○", "-", "•", "é", "—",
+    "\n", "\n\n", "\n\n\n", " ", "  ", "\t", "\r\n", "\x0c", "\xa0", " ", "　",
+    "__PRESERVE_NEWLINE__", "__PRESERVE_", "NEWLINE__", "_", "__", "1.\n", "●\n", "○\n",
+]
+
+def random_case(rng):
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 200)))
+
+def pdf_texts(paths):
+    for path in paths:
+        reader = PdfReader(path)
+        yield "".join(page.extract_text() or "" for page in reader.pages)
+
+# Function to extract a PDF's page texts the way the app does
+def extract_pages(path):
+    with open(path, "rb") as f:
+        return list(iter_pdf_pages(f, {}, workers=1))
+
+# Function to re-extract every fixture PDF, recording the cleaned text the legacy function gives
+def update_fixtures():
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.pdf"))):
+        pages = extract_pages(path)
+        fixture = {"source": os.path.basename(path), "pages": pages, "cleaned": legacy_clean_pdf_text("".join(pages))}
+        with open(path[:-len(".pdf")] + ".json", "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"updated {os.path.basename(path)[:-len('.pdf')]}.json ({len(pages)} pages)")
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            fixtures.append(json.load(f))
+    return fixtures
+
+def normalize_pages(pages):
+    normalizer = TextNormalizer()
+    return "".join([normalizer.feed(page) for page in pages] + [normalizer.finish()])
+
+# Function to check the fixtures against their recorded cleaned text, whole, page by
+# page (as documents are processed) and in random pieces
+def check_fixtures(fixtures, rng):
+    for fixture in fixtures:
+        text = "".join(fixture["pages"])
+        name = fixture["source"]
+        assert legacy_clean_pdf_text(text) == fixture["cleaned"], f"{name}: legacy output differs from the fixture"
+        assert clean_pdf_text(text) == fixture["cleaned"], f"{name}: clean_pdf_text differs from the fixture"
+        assert normalize_pages(fixture["pages"]) == fixture["cleaned"], f"{name}: page-by-page TextNormalizer differs from the fixture"
+        for _ in range(50):
+            assert normalize_in_pieces(text, rng) == fixture["cleaned"], f"{name}: TextNormalizer in pieces differs from the fixture"
+
+def normalize_in_pieces(text, rng):
+    normalizer = TextNormalizer()
+    parts = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 64)
+        parts.append(normalizer.feed(text[position:position + size]))
+        position += size
+    parts.append(normalizer.finish())
+    return "".join(parts)
+
+def check(corpus, rng):
+    for text in corpus:
+        expected = legacy_clean_pdf_text(text)
+        assert clean_pdf_text(text) == expected, repr(text)
+        assert normalize_in_pieces(text, rng) == expected, repr(text)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDF files whose extracted text joins the corpus")
+    parser.add_argument("--cases", type=int, default=2000, help="number of randomized cases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="only run the equivalence check")
+    parser.add_argument("--update-fixtures", action="store_true", help="re-extract the fixture PDFs and exit")
+    args = parser.parse_args()
+
+    if args.update_fixtures:
+        update_fixtures()
+        return
+    rng = random.Random(args.seed)
+    fixtures = load_fixtures()
+    if not fixtures:
+        sys.exit(f"no fixtures found in {FIXTURES_DIR}")
+    check_fixtures(fixtures, rng)
+    print(f"fixtures: {len(fixtures)} extracted documents match their recorded cleaned text")
+    corpus = [random_case(rng) for _ in range(args.cases)] + list(pdf_texts(args.pdf))
+    check(corpus, rng)
+    print(f"equivalence: {len(corpus)} documents identical to the legacy function")
+    if args.check:
+        return
+    corpus += ["".join(fixture["pages"]) for fixture in fixtures]
+
+    # Benchmark on one large document built from the corpus
+    document = "".join(corpus)
+    while len(document) < 5_000_000:
+        document += document
+    for name, function in (("legacy", legacy_clean_pdf_text), ("single-pass", clean_pdf_text)):
+        seconds = min(timeit.repeat(lambda: function(document), number=1, repeat=5))
+        print(f"{name:12s} {seconds * 1000:8.1f} ms  ({len(document) / seconds / 1e6:.1f} MB/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# End-to-end benchmarks against a local Granite stand-in (benchmarks/stub_model.py).
+#
+# Scenarios:
+#   document_<N>_pages   extract + clean + summarize_document on a synthetic N-page PDF
+#   chat_turn_<mode>     streamed single-mode chat turns, as the UI runs them
+#                        (blocking calls with --blocking)
+#   concurrent_sessions  several sessions chatting at once in alternating modes
+#   ideas_<mode>         N ideas from one multi-idea call vs N single-idea calls
+#
+# Results are written as JSON (p50/p95/p99 latency, throughput, peak memory) so
+# runs on different commits can be compared:
+#
+#   python benchmarks/bench_end_to_end.py --output bench.json
+#   python benchmarks/bench_end_to_end.py --pages 1 10 --latency 0.5 --token-rate 60 --failure-rate 0.05
+#   python benchmarks/bench_end_to_end.py --pages --blocking --failure-rate 0.1 --slow-rate 0.05 --slow-latency 20 --hedging
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Never reach out to the model hub, so runs do not depend on the network: without a
+# cached embedding model, idea ranking falls back to word overlap at once
+os.environ["BUDDY_OFFLINE"] = "1"
+os.environ["HF_HUB_OFFLINE"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from brainstorm_buddy.clients import ModelClientRegistry, set_client_registry
+from brainstorm_buddy.config import (
+    BREAKER_FAILURES, HEDGING_ENABLED, MODEL_DEADLINES, MODEL_MAX_CONCURRENCY, MODEL_RATE_BURST, MODEL_RATE_LIMIT,
+    RETRY_ATTEMPTS, THINKING_MODES
+)
+from brainstorm_buddy.extraction import extract_clean_text, peak_rss_bytes
+from brainstorm_buddy.generation import get_ai_response, stream_ai_response
+from brainstorm_buddy.ideas import generate_ideas
+from brainstorm_buddy.resilience import CircuitBreaker, ResilientCaller, set_resilient_caller
+from brainstorm_buddy.scheduler import RequestScheduler, set_scheduler
+from brainstorm_buddy.summarization import summarize_document
+from stub_model import StubModelFactory
+
+WORDS = [
+    "marketing", "soap", "lavender", "budget", "quarter", "launch", "retail", "customers",
+    "feedback", "campaign", "partners", "packaging", "pricing", "samples", "survey", "team",
+]
+QUESTIONS = [
+    "How can we launch the lavender soap line with a small budget?",
+    "What events could bring new customers into the store?",
+    "How do we turn one-time buyers into subscribers?",
+    "Which partners could help us reach younger customers?",
+]
+CHAT_MODES = THINKING_MODES + [None]
+
+# Function to build the lines of one synthetic meeting-notes page
+def page_lines(rng, page_number):
+    lines = [f"Meeting notes page {page_number}"]
+    for item in range(1, 41):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12)))
+        if item % 5 == 0:
+            lines.append(f"{item // 5}.")
+        lines.append(("- " if item % 3 == 0 else "") + sentence)
+    return lines
+
+# Function to build a minimal text PDF with one content stream per page
+def make_pdf(page_count, seed=0):
+    rng = random.Random(seed)
+    kids = " ".join(f"{4 + 2 * index} 0 R" for index in range(page_count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for index in range(page_count):
+        shown = " ".join(f"({line}) '" for line in page_lines(rng, index + 1))
+        content = f"BT /F1 10 Tf 40 800 Td 12 TL {shown} ET".encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * index} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+# Function to compute a percentile with linear interpolation
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+# Function to summarize a list of durations in seconds
+def distribution(values):
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+def is_error(text):
+    return text.startswith("Error generating")
+
+# Function to run extraction, cleaning and summarization on a synthetic PDF
+def bench_document(page_count, repeats, concurrency):
+    pdf = make_pdf(page_count)
+    latencies, errors = [], 0
+    stages = {"extraction_time": [], "cleaning_time": [], "map": [], "reduce": []}
+    chunks = 0
+    for _ in range(repeats):
+        stats = {}
+        start = time.perf_counter()
+        cleaned_text = extract_clean_text(io.BytesIO(pdf), "synthetic.pdf", stats)
+        summary = summarize_document(cleaned_text, stats, concurrency)
+        latencies.append(time.perf_counter() - start)
+        errors += is_error(summary)
+        for stage, values in stages.items():
+            if stage in stats:
+                values.append(stats[stage])
+        chunks = max(chunks, stats.get("chunks", 0))
+    wall = sum(latencies)
+    return {
+        "name": f"document_{page_count}_pages",
+        "pages": page_count,
+        "pdf_bytes": len(pdf),
+        "text_chars": len(cleaned_text),
+        "chunks": chunks,
+        "runs": repeats,
+        "errors": errors,
+        "latency": distribution(latencies),
+        "stages": {stage: distribution(values) for stage, values in stages.items() if values},
+        "throughput": {"documents_per_s": repeats / wall, "pages_per_s": repeats * page_count / wall},
+    }
+
+# Function to run one chat turn, streamed or blocking, returning (reply, latency, time to first token)
+def chat_turn(question, mode, history, summary, blocking=False):
+    timings = {}
+    start = time.perf_counter()
+    if blocking:
+        reply = get_ai_response(question, mode, history, summary, timings=timings)
+    else:
+        reply = "".join(stream_ai_response(question, mode, history, timings, summary))
+    return reply, time.perf_counter() - start, timings.get("time_to_first_token")
+
+# Function to run sequential chat turns in one thinking mode
+def bench_chat(mode, turns, summary, blocking=False):
+    history, latencies, first_tokens, errors = [], [], [], 0
+    start = time.perf_counter()
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        reply, latency, first_token = chat_turn(question, mode, history, summary, blocking)
+        latencies.append(latency)
+        if first_token is not None:
+            first_tokens.append(first_token)
+        errors += is_error(reply)
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": reply}]
+    wall = time.perf_counter() - start
+    return {
+        "name": f"chat_turn_{(mode or 'conversational').lower()}",
+        "runs": turns,
+        "errors": errors,
+        "latency": distribution(latencies),
+        "time_to_first_token": distribution(first_tokens),
+        "throughput": {"turns_per_s": turns / wall},
+    }
+
+# Function to run several chat sessions at once, each cycling through the modes
+def bench_sessions(sessions, turns, summary, blocking=False):
+    latencies, first_tokens = [], []
+    errors = 0
+    lock = threading.Lock()
+
+    def run_session(session):
+        nonlocal errors
+        history = []
+        for turn in range(turns):
+            mode = CHAT_MODES[(session + turn) % len(CHAT_MODES)]
+            question = QUESTIONS[(session + turn) % len(QUESTIONS)]
+            reply, latency, first_token = chat_turn(question, mode, history, summary, blocking)
+            history += [{"role": "user", "content": question}, {"role": "assistant", "content": reply}]
+            with lock:
+                latencies.append(latency)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+                errors += is_error(reply)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(run_session, range(sessions)))
+    wall = time.perf_counter() - start
+    return {
+        "name": "concurrent_sessions",
+        "sessions": sessions,
+        "runs": sessions * turns,
+        "errors": errors,
+        "wall_time": wall,
+        "latency": distribution(latencies),
+        "time_to_first_token": distribution(first_tokens),
+        "throughput": {"turns_per_s": sessions * turns / wall},
+    }
+
+# Function to compare asking a thinking mode for count ideas in one call with asking it
+# count times, per idea. Both paths generate idea_tokens tokens per idea.
+def bench_ideas(factory, mode, count, repeats, idea_tokens, summary):
+    output_tokens = factory.output_tokens
+    factory.output_tokens = idea_tokens
+    batched, repeated = {"time": [], "tokens": [], "ideas": 0, "similarity": set()}, {"time": [], "tokens": []}
+    errors = 0
+    try:
+        for run in range(repeats):
+            question = QUESTIONS[run % len(QUESTIONS)]
+            start = time.perf_counter()
+            for _ in range(count):
+                timings = {}
+                errors += is_error(get_ai_response(question, mode, [], summary, timings=timings))
+                repeated["tokens"].append(timings.get("input_tokens", 0) + timings.get("generated_tokens", 0))
+            repeated["time"].append((time.perf_counter() - start) / count)
+            timings = {}
+            start = time.perf_counter()
+            try:
+                ideas = generate_ideas(question, mode, count, [], summary, timings=timings)
+            except Exception:
+                ideas = []
+                errors += 1
+            batched["time"].append(time.perf_counter() - start)
+            batched["ideas"] += len(ideas)
+            batched["similarity"].add(timings.get("similarity"))
+            batched["tokens"].append(timings.get("input_tokens", 0) + timings.get("generated_tokens", 0))
+    finally:
+        factory.output_tokens = output_tokens
+    ideas = max(1, batched["ideas"])
+    batched_time = sum(batched["time"]) / ideas
+    repeated_time = sum(repeated["time"]) / len(repeated["time"])
+    batched_tokens = sum(batched["tokens"]) / ideas
+    repeated_tokens = sum(repeated["tokens"]) / len(repeated["tokens"])
+    return {
+        "name": f"ideas_{mode.lower()}",
+        "ideas_requested": count,
+        "runs": repeats,
+        "errors": errors,
+        "latency": distribution(batched["time"]),
+        "ideas_per_run": batched["ideas"] / repeats,
+        "similarity": sorted(method for method in batched["similarity"] if method),
+        "per_idea": {
+            "batched_time": batched_time,
+            "repeated_time": repeated_time,
+            "batched_tokens": batched_tokens,
+            "repeated_tokens": repeated_tokens,
+            "time_ratio": batched_time / repeated_time if repeated_time else None,
+            "token_ratio": batched_tokens / repeated_tokens if repeated_tokens else None,
+        },
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Function to run a scenario and attach its model-call counts and the memory high-water mark
+def measure(factory, scenario, *args):
+    calls_before = dict(factory.stats)
+    result = scenario(*args)
+    result["model_calls"] = {key: factory.stats[key] - calls_before[key] for key in factory.stats}
+    # Process-wide high-water mark; scenarios run from smallest to largest
+    result["peak_rss"] = peak_rss_bytes()
+    latency = result["latency"]
+    sys.stderr.write(f"{result['name']}: p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, p99 {latency['p99']:.3f}s, {result['errors']} errors\n")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the brainstorming pipeline against a local stand-in for Granite.")
+    parser.add_argument("--pages", type=int, nargs="*", default=[1, 10, 100, 500], help="synthetic PDF sizes to summarize")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per document size")
+    parser.add_argument("--chat-turns", type=int, default=20, help="chat turns per thinking mode")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent chat sessions")
+    parser.add_argument("--session-turns", type=int, default=5, help="chat turns per concurrent session")
+    parser.add_argument("--ideas", type=int, default=5, help="ideas per multi-idea request (0 skips the ideas scenarios)")
+    parser.add_argument("--idea-tokens", type=int, default=80, help="stub tokens per generated idea")
+    parser.add_argument("--summary-concurrency", type=int, default=4, help="parallel chunk summaries")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=500.0, help="stub generated tokens per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of stub calls that stall before answering")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="stub seconds a stalled call waits")
+    parser.add_argument("--model-concurrency", type=int, default=None, help="stub limit on requests in flight")
+    parser.add_argument("--rate-limit", type=float, default=MODEL_RATE_LIMIT, help="scheduler requests per second (0 = unlimited)")
+    parser.add_argument("--rate-burst", type=int, default=MODEL_RATE_BURST, help="scheduler burst size")
+    parser.add_argument("--max-concurrency", type=int, default=MODEL_MAX_CONCURRENCY, help="scheduler requests in flight")
+    parser.add_argument("--deadline", type=float, default=None, help="seconds every model call may take (default: per-profile deadlines)")
+    parser.add_argument("--retry-attempts", type=int, default=RETRY_ATTEMPTS, help="attempts per model call for transient errors")
+    parser.add_argument("--breaker-failures", type=int, default=BREAKER_FAILURES, help="consecutive failures that open the circuit breaker")
+    parser.add_argument("--hedging", action="store_true", default=HEDGING_ENABLED, help="hedge slow calls after their p95 latency (time to first chunk for streams)")
+    parser.add_argument("--blocking", action="store_true", help="run chat turns as blocking calls instead of streams")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    factory = StubModelFactory(
+        args.latency, args.token_rate, args.failure_rate, args.seed, concurrency=args.model_concurrency,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency
+    )
+    set_client_registry(ModelClientRegistry(None, None, model_factory=factory))
+    scheduler = RequestScheduler(args.rate_limit, args.rate_burst, args.max_concurrency)
+    set_scheduler(scheduler)
+    deadlines = {profile: args.deadline for profile in MODEL_DEADLINES} if args.deadline else MODEL_DEADLINES
+    caller = ResilientCaller(
+        deadlines, args.retry_attempts, breaker=CircuitBreaker(args.breaker_failures), hedging=args.hedging, seed=args.seed
+    )
+    set_resilient_caller(caller)
+    summary = "The team discussed launching a lavender soap line, a small marketing budget and ideas for reaching new customers."
+
+    scenarios = []
+    for page_count in sorted(args.pages):
+        scenarios.append(measure(factory, bench_document, page_count, args.repeats, args.summary_concurrency))
+    if args.chat_turns:
+        for mode in CHAT_MODES:
+            scenarios.append(measure(factory, bench_chat, mode, args.chat_turns, summary, args.blocking))
+    if args.sessions and args.session_turns:
+        scenarios.append(measure(factory, bench_sessions, args.sessions, args.session_turns, summary, args.blocking))
+    if args.ideas:
+        for mode in THINKING_MODES:
+            scenarios.append(measure(factory, bench_ideas, factory, mode, args.ideas, args.repeats, args.idea_tokens, summary))
+
+    results = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stub": {
+            "latency": args.latency,
+            "token_rate": args.token_rate,
+            "failure_rate": args.failure_rate,
+            "slow_rate": args.slow_rate,
+            "slow_latency": args.slow_latency,
+            "model_concurrency": args.model_concurrency,
+            "seed": args.seed,
+        },
+        "scheduler": {
+            "rate_limit": args.rate_limit,
+            "rate_burst": args.rate_burst,
+            "max_concurrency": args.max_concurrency,
+            "stats": scheduler.snapshot(),
+        },
+        "resilience": {
+            "deadlines": deadlines,
+            "retry_attempts": args.retry_attempts,
+            "breaker_failures": args.breaker_failures,
+            "hedging": args.hedging,
+            "blocking": args.blocking,
+            "stats": caller.snapshot(),
+        },
+        "scenarios": scenarios,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
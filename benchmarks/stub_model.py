@@ -0,0 +1,142 @@
+# Deterministic local stand-in for the Granite ModelInference client.
+#
+# Replies are built from a fixed vocabulary seeded by the prompt, so the same
+# prompt always produces the same text. Each call waits for a configurable
+# latency plus the time to generate its tokens at a configurable rate, a seeded
+# fraction of calls fails, and another stalls for slow_latency seconds before
+# answering, so timings, retries, deadlines and hedging can be measured without
+# the watsonx service. A prompt asking for "a numbered list of N ideas" gets N
+# numbered lines, each drawn from its own slice of the vocabulary:
+#
+#   factory = StubModelFactory(latency=0.1, token_rate=500, failure_rate=0.02, slow_rate=0.05, slow_latency=30)
+#   set_client_registry(ModelClientRegistry(None, None, model_factory=factory))
+import hashlib
+import random
+import re
+import threading
+import time
+
+VOCABULARY = [
+    "soap", "lavender", "campaign", "launch", "budget", "customers", "market", "idea",
+    "bundle", "subscription", "refill", "bar", "scent", "packaging", "partner", "event",
+    "discount", "loyalty", "social", "video", "sample", "store", "online", "season",
+]
+
+# Tokens per list item (or output_tokens, when set) in numbered-list replies
+LIST_ITEM_TOKENS = 60
+LIST_REQUEST = re.compile(r"numbered list of (\d+)")
+# Distinct words each list item draws from, so items differ from one another
+LIST_ITEM_WORDS = 8
+
+# A ConnectionError, so injected failures are retried like dropped connections
+class StubModelError(ConnectionError):
+    pass
+
+# Shared settings, failure RNG and call statistics for all stub clients
+class StubModelFactory:
+    def __init__(self, latency=0.1, token_rate=500.0, failure_rate=0.0, seed=0, output_tokens=None, concurrency=None, slow_rate=0.0, slow_latency=10.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # Tokens per reply; by default each reply uses the profile's max_new_tokens
+        self.output_tokens = output_tokens
+        self.stats = {"calls": 0, "failures": 0, "slow_calls": 0, "input_tokens": 0, "generated_tokens": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Caps requests in flight, like a service-side concurrency limit
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+
+    def __call__(self, model_id, params):
+        return StubModelInference(model_id, params, self)
+
+    # Function to count a call and decide whether it fails, returning (failed, delay)
+    def start_call(self, input_tokens):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["input_tokens"] += input_tokens
+            failed = self._random.random() < self.failure_rate
+            slow = self._random.random() < self.slow_rate
+            if failed:
+                self.stats["failures"] += 1
+            if slow:
+                self.stats["slow_calls"] += 1
+        return failed, self.slow_latency if slow else self.latency
+
+    def count_generated(self, tokens):
+        with self._lock:
+            self.stats["generated_tokens"] += tokens
+
+    def acquire(self):
+        if self._slots is not None:
+            self._slots.acquire()
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+class StubModelInference:
+    def __init__(self, model_id, params, factory):
+        self.model_id = model_id
+        self.params = params
+        self.factory = factory
+
+    def _reply_tokens(self, prompt):
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        max_tokens = self.params.get("max_new_tokens", 100)
+        match = LIST_REQUEST.search(prompt)
+        if match is None:
+            count = self.factory.output_tokens or max_tokens
+            return [rng.choice(VOCABULARY) for _ in range(count)]
+        # One numbered line per requested item, cut off at max_new_tokens like the real model
+        tokens = []
+        for number in range(1, int(match.group(1)) + 1):
+            words = rng.sample(VOCABULARY, LIST_ITEM_WORDS)
+            item = [rng.choice(words) for _ in range(self.factory.output_tokens or LIST_ITEM_TOKENS)]
+            tokens += [("\n" if tokens else "") + f"{number}."] + item
+        return tokens[:max_tokens]
+
+    def _start(self, prompt):
+        input_tokens = max(1, len(prompt) // 4)
+        failed, delay = self.factory.start_call(input_tokens)
+        self.factory.acquire()
+        time.sleep(delay)
+        if failed:
+            self.factory.release()
+            raise StubModelError("Injected failure from the stub model")
+        return input_tokens
+
+    def generate_text(self, prompt, guardrails=False, raw_response=False, **kwargs):
+        input_tokens = self._start(prompt)
+        try:
+            tokens = self._reply_tokens(prompt)
+            time.sleep(len(tokens) / self.factory.token_rate)
+        finally:
+            self.factory.release()
+        self.factory.count_generated(len(tokens))
+        text = " ".join(tokens)
+        if not raw_response:
+            return text
+        return {
+            "model_id": self.model_id,
+            "results": [{
+                "generated_text": text,
+                "generated_token_count": len(tokens),
+                "input_token_count": input_tokens,
+                "stop_reason": "max_tokens",
+            }],
+        }
+
+    def generate_text_stream(self, prompt, guardrails=False, **kwargs):
+        # Like the SDK, nothing is sent until the generator is first advanced
+        self._start(prompt)
+        try:
+            tokens = self._reply_tokens(prompt)
+            for index, token in enumerate(tokens):
+                time.sleep(1 / self.factory.token_rate)
+                yield token if index == 0 else " " + token
+        finally:
+            self.factory.release()
+            self.factory.count_generated(len(tokens))
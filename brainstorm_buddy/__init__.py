@@ -0,0 +1,14 @@
+# AI Brainstorming Buddy core: prompt building, Granite calls, document processing
+# and caching, importable without the Streamlit UI.
+from .batch import run_batch
+from .caching import get_response_cache, get_summary_cache
+from .clients import ModelClientRegistry, get_client_registry, set_client_registry
+from .config import MODEL_PARAMETERS, THINKING_MODES
+from .documents import process_document
+from .extraction import clean_pdf_text, extract_clean_text
+from .generation import compare_thinking_modes, get_ai_response, stream_ai_response
+from .ideas import generate_ideas
+from .metrics import get_metrics
+from .prompts import build_prompt, build_summary_prompt
+from .summarization import summarize_document
+from .workspace import DocumentWorkspace
@@ -0,0 +1,113 @@
+from .config import CONTEXT_WINDOW, MODEL_PARAMETERS, PROMPT_TOKEN_BUDGET, RECENT_HISTORY_MESSAGES
+from .prompts import build_history_summary_prompt, build_prompt, format_conversation
+from .tokenizer import get_token_counter
+
+# Tokens held back for section headings and separators that are not counted per section
+SECTION_MARGIN = 16
+
+# Rolling memory of a chat session. The latest messages stay verbatim; once enough
+# newer ones build up, the older ones are folded into a short summary in one
+# bounded batch, so neither the prompt nor the folding cost grows with the session.
+class ConversationMemory:
+    def __init__(self, recent_messages=RECENT_HISTORY_MESSAGES):
+        self.recent_messages = recent_messages
+        self.summary = ""
+        # Number of leading chat_history messages already folded into summary
+        self.summarized_count = 0
+        self.stats = {"folds": 0, "folded_messages": 0}
+
+    def needs_fold(self, chat_history):
+        return len(chat_history) - self.summarized_count > 2 * self.recent_messages
+
+    # Function to build the fold prompt, returning (stop, prompt) where stop is the
+    # history position the new summary will cover up to
+    def fold_prompt(self, chat_history):
+        stop = len(chat_history) - self.recent_messages
+        messages = chat_history[self.summarized_count:stop]
+        return stop, build_history_summary_prompt(self.summary, format_conversation("", messages))
+
+    def apply_fold(self, summary, stop):
+        self.stats["folds"] += 1
+        self.stats["folded_messages"] += stop - self.summarized_count
+        self.summary = summary.strip()
+        self.summarized_count = stop
+
+# Function to get the conversation a chat prompt is assembled from, as (rolling
+# summary, messages not yet folded into it), leaving out the question being asked
+def conversation_inputs(user_question, chat_history=None, memory=None):
+    chat_history = chat_history or []
+    summarized = min(memory.summarized_count, len(chat_history)) if memory is not None else 0
+    history_summary = memory.summary if summarized else ""
+    # Only the messages not yet folded into the summary are read
+    history = list(chat_history[summarized:])
+    # The UI appends the question to the history before asking for the reply
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == user_question:
+        history.pop()
+    return history_summary, history
+
+# Function to render the conversation a chat prompt is assembled from, for cache scopes
+def conversation_context(user_question, chat_history=None, memory=None):
+    return format_conversation(*conversation_inputs(user_question, chat_history, memory))
+
+# Function to get the prompt token budget for a parameter profile, leaving room for its reply
+def prompt_budget(profile):
+    return min(PROMPT_TOKEN_BUDGET, CONTEXT_WINDOW - MODEL_PARAMETERS[profile]["max_new_tokens"])
+
+# Function to assemble a chat prompt within the token budget. Sections are filled in
+# priority order: instructions, the question, document context (summary, then
+# retrieved excerpts), the most recent messages, then the rolling summary of older
+# ones. Returns (profile, prompt, report) where report gives the tokens per section.
+# build takes build_prompt's arguments and returns (profile, prompt).
+def assemble_prompt(user_question, thinking_mode=None, chat_history=None, document_summary="", excerpts=None, memory=None, counter=None, build=build_prompt):
+    counter = counter or get_token_counter()
+    history_summary, history = conversation_inputs(user_question, chat_history, memory)
+
+    profile, skeleton = build("", thinking_mode, None, "", None, "")
+    budget = prompt_budget(profile)
+    sections = {"instructions": counter.count(skeleton)}
+    remaining = budget - sections["instructions"] - SECTION_MARGIN
+    user_question = counter.truncate(user_question, remaining)
+    sections["question"] = counter.count(user_question)
+    remaining -= sections["question"]
+
+    # Document context is only part of the thinking-mode prompts
+    context_tokens = 0
+    kept_excerpts = []
+    if thinking_mode:
+        document_summary = counter.truncate(document_summary, remaining)
+        context_tokens = counter.count(document_summary)
+        for excerpt in excerpts or []:
+            tokens = counter.count(f"- {excerpt}\n")
+            if context_tokens + tokens > remaining:
+                break
+            kept_excerpts.append(excerpt)
+            context_tokens += tokens
+    sections["context"] = context_tokens
+    remaining -= context_tokens
+
+    # Newest messages first, while they fit
+    turns = []
+    turn_tokens = 0
+    for message in reversed(history):
+        tokens = counter.count(format_conversation("", [message]) + "\n")
+        if turn_tokens + tokens > remaining:
+            break
+        turns.insert(0, message)
+        turn_tokens += tokens
+    sections["recent_turns"] = turn_tokens
+    remaining -= turn_tokens
+
+    history_summary = counter.truncate(history_summary, remaining)
+    sections["history_summary"] = counter.count(history_summary)
+
+    conversation = format_conversation(history_summary, turns)
+    profile, prompt = build(user_question, thinking_mode, history, document_summary, kept_excerpts, conversation)
+    report = {
+        "sections": sections,
+        "total": counter.count(prompt),
+        "budget": budget,
+        "messages": len(turns),
+        "excerpts": len(kept_excerpts),
+        "tokenizer": counter.name,
+    }
+    return profile, prompt, report
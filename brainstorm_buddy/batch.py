@@ -0,0 +1,167 @@
+import os
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .config import THINKING_MODES
+from .documents import find_documents, process_document
+from .generation import generate, prepare_prompt
+from .scheduler import BULK
+
+# Function to read questions from a JSONL file. Each line is an object with a
+# "question" and optionally an "id", a "document" file name and a list of "modes".
+# Raises ValueError for a line that is not JSON or names a mode that is not a thinking mode.
+def load_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                question = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}, line {line_number}: {str(e)}") from None
+            modes = question.get("modes", THINKING_MODES)
+            if not isinstance(modes, list):
+                raise ValueError(f"{path}, line {line_number}: \"modes\" must be a list of thinking modes")
+            unknown = [mode for mode in modes if mode not in THINKING_MODES]
+            if unknown:
+                raise ValueError(f"{path}, line {line_number}: unknown thinking mode(s): {', '.join(map(str, unknown))}")
+            question.setdefault("id", str(line_number))
+            questions.append(question)
+    return questions
+
+# Function to read the ids of tasks already completed in an earlier run of the same output file
+def load_checkpoint(output_path):
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A run interrupted mid-write leaves a partial last line
+                continue
+            if "error" not in result:
+                done.add(result["task_id"])
+    return done
+
+# Function to summarize and index every document, in parallel, keyed by file name.
+# A document that cannot be processed is logged and left out, so one bad file does not
+# stop the batch; returns (documents, failures), failures mapping file name to the error.
+def process_documents(paths, concurrency, log):
+    documents = {}
+    failures = {}
+
+    def process(path):
+        name = os.path.basename(path)
+        stats = {}
+        try:
+            with open(path, "rb") as f:
+                document = process_document(f, name, stats)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            log(f"failed to process {name}: {error}")
+            return name, None, error
+        log(f"processed {document['name']} in {stats['processing_time']:.1f}s" + (" (cached summary)" if stats["summary_cached"] else ""))
+        return name, document, None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for name, document, error in pool.map(process, paths):
+            if document is None:
+                failures[name] = error
+            else:
+                documents[document["name"]] = document
+    return documents, failures
+
+# Function to expand questions into (task_id, question, document, mode) tasks. A question
+# naming a document that is missing or failed gets a document entry carrying the error,
+# so its tasks are written as error records instead of stopping the batch.
+def iter_tasks(questions, documents, modes, failures=None):
+    failures = failures or {}
+    for question in questions:
+        name = question.get("document")
+        if name:
+            if name in documents:
+                targets = [documents[name]]
+            else:
+                targets = [{"name": name, "error": failures.get(name, f"document not found: {name}")}]
+        else:
+            targets = list(documents.values()) or [None]
+        for document in targets:
+            for mode in question.get("modes", modes):
+                document_name = document["name"] if document else ""
+                yield f"{question['id']}|{document_name}|{mode}", question, document, mode
+
+# Function to run one generation task and build its output record
+def run_task(task_id, question, document, mode):
+    timings = {}
+    record = {"task_id": task_id, "id": question["id"], "question": question["question"], "mode": mode, "document": document["name"] if document else None}
+    if document and document.get("error"):
+        record["error"] = document["error"]
+        record["timings"] = timings
+        return record
+    summary = document["summary"] if document else ""
+    content_hash = document["hash"] if document and document["indexed"] else None
+    try:
+        profile, prompt = prepare_prompt(question["question"], mode, None, summary, content_hash, timings=timings)
+        record["response"] = generate(profile, prompt, timings, priority=BULK)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {str(e)}"
+    record["timings"] = timings
+    return record
+
+# Headless batch ideation: questions x documents x modes with bounded concurrency.
+# Results are appended to output_path as JSONL as they complete, and that file is
+# also the checkpoint: re-running skips tasks that already succeeded. questions is a
+# JSONL file path or questions already read with load_questions.
+def run_batch(questions, document_path, output_path, modes=THINKING_MODES, concurrency=4, log=print):
+    if isinstance(questions, str):
+        questions = load_questions(questions)
+    document_paths = find_documents(document_path) if document_path else []
+    documents, failures = process_documents(document_paths, concurrency, log)
+    done = load_checkpoint(output_path)
+    tasks = [task for task in iter_tasks(questions, documents, modes, failures) if task[0] not in done]
+    log(f"{len(tasks)} tasks to run, {len(done)} already done")
+
+    stats = {"completed": 0, "errors": 0, "input_tokens": 0, "generated_tokens": 0}
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+    pending = set()
+    task_iter = iter(tasks)
+    with open(output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Keep at most two tasks per worker in flight so huge batches stay cheap in memory
+        while True:
+            while len(pending) < concurrency * 2:
+                task = next(task_iter, None)
+                if task is None:
+                    break
+                pending.add(pool.submit(run_task, *task))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                with write_lock:
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                stats["completed"] += 1
+                stats["errors"] += "error" in record
+                stats["input_tokens"] += record["timings"].get("input_tokens", 0)
+                stats["generated_tokens"] += record["timings"].get("generated_tokens", 0)
+                if stats["completed"] % 50 == 0:
+                    log(format_throughput(stats, time.perf_counter() - start))
+    elapsed = time.perf_counter() - start
+    stats["elapsed"] = elapsed
+    stats["requests_per_second"] = stats["completed"] / elapsed if elapsed else 0.0
+    stats["tokens_per_second"] = stats["generated_tokens"] / elapsed if elapsed else 0.0
+    log(format_throughput(stats, elapsed))
+    return stats
+
+# Function to format batch progress
+def format_throughput(stats, elapsed):
+    rate = stats["completed"] / elapsed if elapsed else 0.0
+    tokens = stats["generated_tokens"] / elapsed if elapsed else 0.0
+    return f"{stats['completed']} done ({stats['errors']} errors) · {rate:.2f} req/s · {tokens:.1f} tokens/s"
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from .config import (
+    CACHE_DIR, MODEL_PARAMETERS, RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_MODES, RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_TTL, SUMMARY_CACHE_ENTRIES, SUMMARY_CACHE_MAX_BYTES, SUMMARY_CHUNK_OVERLAP,
+    SUMMARY_CHUNK_TOKENS, SUMMARY_PROMPT_VERSION, THINKING_MODES, model_id
+)
+from .metrics import get_metrics
+from .retrieval import get_index_store
+
+# Two-level summary cache: an in-memory LRU in front of a directory of JSON files
+# that survives restarts and is trimmed to max_bytes, least recently used first.
+class SummaryCache:
+    def __init__(self, directory, memory_entries=SUMMARY_CACHE_ENTRIES, max_bytes=SUMMARY_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "bytes_saved": 0}
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, summary):
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key, document_bytes=0):
+        with self._lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            else:
+                try:
+                    with open(self._path(key), encoding="utf-8") as f:
+                        summary = json.load(f)["summary"]
+                    # Refresh the mtime so disk eviction stays least-recently-used
+                    os.utime(self._path(key))
+                    self._remember(key, summary)
+                    self.stats["disk_hits"] += 1
+                except (OSError, ValueError, KeyError):
+                    self.stats["misses"] += 1
+                    return None
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += document_bytes
+            return summary
+
+    def put(self, key, summary):
+        with self._lock:
+            self._remember(key, summary)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "created": time.time()}, f)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            self._memory.pop(name[:-len(".json")], None)
+            total -= size
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+# Function to hash uploaded document bytes
+def document_hash(document_bytes):
+    return hashlib.sha256(document_bytes).hexdigest()
+
+# Function to derive the summary cache key from the document hash and everything that shapes the summary
+def summary_cache_key(content_hash):
+    config = json.dumps({
+        "prompt_version": SUMMARY_PROMPT_VERSION,
+        "model_id": model_id,
+        "summary": MODEL_PARAMETERS["Summary"],
+        "chunk_summary": MODEL_PARAMETERS["ChunkSummary"],
+        "chunk_tokens": SUMMARY_CHUNK_TOKENS,
+        "chunk_overlap": SUMMARY_CHUNK_OVERLAP,
+    }, sort_keys=True)
+    return hashlib.sha256((content_hash + config).encode("utf-8")).hexdigest()
+
+# Shared cache of generated answers with TTL and LRU eviction. Entries are grouped by
+# scope (mode, document summary and parameter profile); within a scope, a question
+# matches exactly after normalization or, optionally, by embedding similarity.
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL, similarity=RESPONSE_CACHE_SIMILARITY, embed=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "generation_seconds_saved": 0.0}
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl
+
+    def _embed(self, question):
+        if self.similarity <= 0 or self.embed is None:
+            return None
+        try:
+            return self.embed([question])[0]
+        except Exception:
+            return None
+
+    def _find_similar(self, scope, embedding):
+        best_key, best_score = None, self.similarity
+        for key, entry in self._entries.items():
+            if entry["scope"] != scope or entry["embedding"] is None or self._expired(entry):
+                continue
+            score = float(entry["embedding"] @ embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, question, scope):
+        question = normalize_question(question)
+        key = hashlib.sha256(f"{scope}\n{question}".encode("utf-8")).hexdigest()
+        embedding = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+        if entry is None and self.similarity > 0:
+            embedding = self._embed(question)
+            if embedding is not None:
+                with self._lock:
+                    key = self._find_similar(scope, embedding)
+                    entry = self._entries.get(key) if key else None
+                    if entry is not None:
+                        self.stats["similar_hits"] += 1
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["generation_seconds_saved"] += entry["generation_time"]
+            return entry
+
+    def put(self, question, scope, response, generation_time):
+        question = normalize_question(question)
+        key = hashlib.sha256(f"{scope}\n{question}".encode("utf-8")).hexdigest()
+        entry = {
+            "response": response,
+            "scope": scope,
+            "created": time.time(),
+            "generation_time": generation_time,
+            "embedding": self._embed(question)
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+# Function to normalize a question for cache lookups
+def normalize_question(question):
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+# Function to derive the response cache scope for a mode, document summary and the
+# conversation the prompt is built from, so a follow-up such as "can you elaborate?"
+# only reuses answers given in the same conversation
+def response_cache_scope(mode, document_summary, conversation=""):
+    summary_hash = hashlib.sha256(document_summary.encode("utf-8")).hexdigest()
+    conversation_hash = hashlib.sha256(conversation.encode("utf-8")).hexdigest()
+    parameters = json.dumps(MODEL_PARAMETERS[mode], sort_keys=True)
+    return f"{model_id}|{mode}|{summary_hash}|{conversation_hash}|{parameters}"
+
+# Modes whose answers are reused by default: greedy profiles plus any listed in BUDDY_RESPONSE_CACHE_MODES
+DEFAULT_CACHED_MODES = [
+    mode for mode in THINKING_MODES + ["Conversational"]
+    if mode in RESPONSE_CACHE_MODES or MODEL_PARAMETERS[mode]["decoding_method"] == "greedy"
+]
+
+_summary_cache = None
+_response_cache = None
+_cache_lock = threading.Lock()
+
+# Function to get the process-wide summary cache
+def get_summary_cache():
+    global _summary_cache
+    with _cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache(os.path.join(CACHE_DIR, "summaries"))
+        return _summary_cache
+
+# Function to get the process-wide response cache
+def get_response_cache():
+    global _response_cache
+    with _cache_lock:
+        if _response_cache is None:
+            index_store = get_index_store()
+            _response_cache = ResponseCache(embed=index_store.embed if index_store is not None else None)
+        return _response_cache
+
+# Function to look up the cached summary of a document by its content hash
+def lookup_summary(content_hash, document_size=0):
+    with get_metrics().span("cache_lookup", "Summary") as record:
+        summary = get_summary_cache().get(summary_cache_key(content_hash), document_size)
+        record["cache"] = "miss" if summary is None else "hit"
+    return summary
+
+# Function to look up a cached answer when the mode is opted in to caching
+def lookup_response(user_question, thinking_mode, document_summary="", cached_modes=DEFAULT_CACHED_MODES, conversation=""):
+    mode = thinking_mode or "Conversational"
+    if mode not in cached_modes:
+        return None
+    with get_metrics().span("cache_lookup", mode) as record:
+        entry = get_response_cache().get(user_question, response_cache_scope(mode, document_summary, conversation))
+        record["cache"] = "miss" if entry is None else "hit"
+    return entry
+
+# Function to store a generated answer when the mode is opted in to caching. Callers
+# must not store replies whose timings record an error, including streams cut off midway.
+def store_response(user_question, thinking_mode, response, generation_time, document_summary="", cached_modes=DEFAULT_CACHED_MODES, conversation=""):
+    mode = thinking_mode or "Conversational"
+    if mode not in cached_modes:
+        return
+    get_response_cache().put(user_question, response_cache_scope(mode, document_summary, conversation), response, generation_time)
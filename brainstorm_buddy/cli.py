@@ -0,0 +1,38 @@
+import argparse
+import json
+import os
+import sys
+from .batch import load_questions, run_batch
+from .config import THINKING_MODES
+
+# Command line entry point for headless batch ideation
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m brainstorm_buddy",
+        description="Run batch ideation: every question in a JSONL file against a folder of meeting documents."
+    )
+    parser.add_argument("--questions", required=True, help="JSONL file with one {\"question\": ...} object per line")
+    parser.add_argument("--documents", help="PDF/text file or folder of files to summarize and ground answers in")
+    parser.add_argument("--output", required=True, help="JSONL file that results are appended to; also used to resume")
+    parser.add_argument("--modes", default=",".join(THINKING_MODES), help="comma-separated thinking modes (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum concurrent model requests (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.documents and not os.path.exists(args.documents):
+        parser.error(f"documents path not found: {args.documents}")
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in THINKING_MODES]
+    if unknown:
+        parser.error(f"unknown thinking mode(s): {', '.join(unknown)}")
+
+    def log(message):
+        sys.stderr.write(message + "\n")
+        sys.stderr.flush()
+
+    try:
+        questions = load_questions(args.questions)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    stats = run_batch(questions, args.documents, args.output, modes, args.concurrency, log)
+    print(json.dumps(stats))
+    return 1 if stats["errors"] else 0
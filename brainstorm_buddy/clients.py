@@ -0,0 +1,92 @@
+import threading
+import time
+from ibm_watsonx_ai import APIClient, Credentials
+from ibm_watsonx_ai.foundation_models import ModelInference
+from .config import MODEL_PARAMETERS, TOKEN_REFRESH_INTERVAL, WATSONX_API_KEY, WATSONX_PROJECT_ID, WATSONX_URL, model_id
+
+# Process-wide registry of warm ModelInference clients, one per (model_id, profile).
+# All clients share a single APIClient, so the auth token and pooled HTTP session
+# are set up once instead of on every summary and chat turn. A model_factory
+# (called as model_factory(model_id, params)) replaces ModelInference, for
+# example with the local stand-in used by the benchmarks.
+class ModelClientRegistry:
+    def __init__(self, credentials, project_id, refresh_interval=TOKEN_REFRESH_INTERVAL, model_factory=None):
+        self.credentials = credentials
+        self.project_id = project_id
+        self.model_factory = model_factory
+        self.stats = {"hits": 0, "misses": 0, "token_refreshes": 0}
+        self._lock = threading.Lock()
+        self._api_client = None
+        self._token = None
+        self._models = {}
+        # Touch the token in the background so it is refreshed ahead of expiry
+        # rather than inside a user's request
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(refresh_interval,), daemon=True)
+        self._refresher.start()
+
+    def _get_api_client(self):
+        if self._api_client is None:
+            self._api_client = APIClient(credentials=self.credentials, project_id=self.project_id)
+            self._token = self._api_client.token
+        return self._api_client
+
+    def get(self, profile, model_id=model_id):
+        key = (model_id, profile)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.stats["hits"] += 1
+                return model
+            self.stats["misses"] += 1
+            if self.model_factory is not None:
+                model = self.model_factory(model_id, MODEL_PARAMETERS[profile])
+            else:
+                # Retries are left to the resilient caller, which keeps them within each call's deadline
+                model = ModelInference(
+                    model_id=model_id,
+                    params=MODEL_PARAMETERS[profile],
+                    api_client=self._get_api_client(),
+                    max_retries=0
+                )
+            self._models[key] = model
+            return model
+
+    def refresh_token(self):
+        with self._lock:
+            api_client = self._api_client
+        if api_client is None:
+            return
+        # The SDK regenerates the token when it is close to expiry
+        token = api_client.token
+        with self._lock:
+            if token != self._token:
+                self._token = token
+                self.stats["token_refreshes"] += 1
+
+    def _refresh_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh_token()
+            except Exception:
+                pass
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# Function to get the process-wide client registry, creating it on first use
+def get_client_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            credentials = Credentials(url=WATSONX_URL, api_key=WATSONX_API_KEY)
+            _registry = ModelClientRegistry(credentials, WATSONX_PROJECT_ID)
+        return _registry
+
+# Function to replace the process-wide client registry, returning the previous one
+def set_client_registry(registry):
+    global _registry
+    with _registry_lock:
+        previous = _registry
+        _registry = registry
+        return previous
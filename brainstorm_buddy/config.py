@@ -0,0 +1,166 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+WATSONX_URL = os.getenv("WATSONX_URL")
+WATSONX_API_KEY = os.getenv("WATSONX_API_KEY")
+WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID")
+
+# IBM Granite model
+model_id = "ibm/granite-3-8b-instruct"
+# Hugging Face tokenizer matching the model, used to count prompt tokens
+TOKENIZER_NAME = os.getenv("BUDDY_TOKENIZER", "ibm-granite/granite-3.0-8b-instruct")
+CONTEXT_WINDOW = 4096
+TOKEN_REFRESH_INTERVAL = int(os.getenv("WATSONX_TOKEN_REFRESH_INTERVAL", "60"))
+STREAMING_ENABLED = os.getenv("BUDDY_STREAMING", "1") == "1"
+THINKING_MODES = ["Creative", "Diverse", "Lateral"]
+# Never reach out to the model hub; local models and tokenizers must already be cached
+OFFLINE = os.getenv("BUDDY_OFFLINE", "0") == "1"
+# Prompt assembly: tokens a chat prompt may use, and how many of the latest messages
+# stay verbatim before older ones are folded into the rolling conversation summary
+PROMPT_TOKEN_BUDGET = int(os.getenv("BUDDY_PROMPT_TOKEN_BUDGET", "2048"))
+RECENT_HISTORY_MESSAGES = int(os.getenv("BUDDY_RECENT_HISTORY_MESSAGES", "6"))
+# Chat history: messages rendered per page, messages kept in session state before older
+# ones move to the per-session SQLite store, and how long idle session stores are kept
+HISTORY_WINDOW_MESSAGES = int(os.getenv("BUDDY_HISTORY_WINDOW_MESSAGES", "20"))
+HISTORY_MEMORY_MESSAGES = int(os.getenv("BUDDY_HISTORY_MEMORY_MESSAGES", "40"))
+SESSION_HISTORY_TTL = int(os.getenv("BUDDY_SESSION_HISTORY_TTL", str(7 * 24 * 3600)))
+# Map-reduce summarization settings, in approximate tokens
+SUMMARY_CHUNK_TOKENS = int(os.getenv("BUDDY_SUMMARY_CHUNK_TOKENS", "2500"))
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("BUDDY_SUMMARY_CHUNK_OVERLAP", "150"))
+SUMMARY_CONCURRENCY = int(os.getenv("BUDDY_SUMMARY_CONCURRENCY", "4"))
+# Document workspace: files ingested at once across all sessions, and the tokens the
+# combined document summaries may take in thinking-mode prompts
+INGEST_WORKERS = int(os.getenv("BUDDY_INGEST_WORKERS", "2"))
+WORKSPACE_SUMMARY_TOKENS = int(os.getenv("BUDDY_WORKSPACE_SUMMARY_TOKENS", "1000"))
+# Summary cache settings. Bump SUMMARY_PROMPT_VERSION whenever the summary prompts change.
+SUMMARY_PROMPT_VERSION = "1"
+CACHE_DIR = os.getenv("BUDDY_CACHE_DIR", ".buddy_cache")
+SUMMARY_CACHE_ENTRIES = int(os.getenv("BUDDY_SUMMARY_CACHE_ENTRIES", "128"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("BUDDY_SUMMARY_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Response cache settings. Sampling modes are only cached when listed in
+# BUDDY_RESPONSE_CACHE_MODES (or opted in from the sidebar).
+RESPONSE_CACHE_ENTRIES = int(os.getenv("BUDDY_RESPONSE_CACHE_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("BUDDY_RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MODES = [mode.strip() for mode in os.getenv("BUDDY_RESPONSE_CACHE_MODES", "").split(",") if mode.strip()]
+# Cosine similarity at which a near-duplicate question reuses a cached answer; 0 disables it
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("BUDDY_RESPONSE_CACHE_SIMILARITY", "0"))
+# Shared model request scheduler: requests per second across all sessions (0 means
+# unlimited), the burst allowed above that rate, and the most requests in flight
+MODEL_RATE_LIMIT = float(os.getenv("BUDDY_MODEL_RATE_LIMIT", "8"))
+MODEL_RATE_BURST = int(os.getenv("BUDDY_MODEL_RATE_BURST", "8"))
+MODEL_MAX_CONCURRENCY = int(os.getenv("BUDDY_MODEL_MAX_CONCURRENCY", "8"))
+# Model call resilience. Seconds each parameter profile may take end to end, queueing,
+# retries and hedges included; override as BUDDY_MODEL_DEADLINES="Creative=15,Summary=60"
+MODEL_DEADLINES = {
+    "Summary": 90.0,
+    "ChunkSummary": 60.0,
+    "HistorySummary": 30.0,
+    "Creative": 30.0,
+    "Diverse": 30.0,
+    "Lateral": 30.0,
+    "Conversational": 20.0,
+}
+MODEL_DEADLINES.update({f"{mode}Ideas": 45.0 for mode in THINKING_MODES})
+MODEL_DEADLINES.update({
+    name.strip(): float(seconds)
+    for name, seconds in (item.split("=", 1) for item in os.getenv("BUDDY_MODEL_DEADLINES", "").split(",") if "=" in item)
+})
+# Attempts per call for transient errors, with full-jitter exponential backoff between them
+RETRY_ATTEMPTS = int(os.getenv("BUDDY_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("BUDDY_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("BUDDY_RETRY_MAX_DELAY", "8"))
+# Consecutive failures that open the circuit breaker, and seconds before it lets a probe through
+BREAKER_FAILURES = int(os.getenv("BUDDY_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BUDDY_BREAKER_RESET_SECONDS", "30"))
+# Hedged requests: once a profile has enough latency samples, an interactive call still
+# running after its p95 (at least HEDGE_MIN_DELAY seconds) is sent a second time; for
+# streams the p95 is of the time to first chunk
+HEDGING_ENABLED = os.getenv("BUDDY_HEDGING", "0") == "1"
+HEDGE_MIN_SAMPLES = int(os.getenv("BUDDY_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("BUDDY_HEDGE_MIN_DELAY", "0.5"))
+# Multi-idea turns: most ideas per request, extra candidates asked for so near-duplicates
+# can be dropped, candidates per model call (calls for one request run concurrently),
+# similarity at which two ideas count as duplicates, and the ranking trade-off between
+# relevance (1.0) and diversity (0.0)
+IDEA_COUNT_MAX = int(os.getenv("BUDDY_IDEA_COUNT_MAX", "8"))
+IDEA_OVERSAMPLE = float(os.getenv("BUDDY_IDEA_OVERSAMPLE", "1.25"))
+IDEAS_PER_CALL = int(os.getenv("BUDDY_IDEAS_PER_CALL", "4"))
+IDEA_DUPLICATE_SIMILARITY = float(os.getenv("BUDDY_IDEA_DUPLICATE_SIMILARITY", "0.85"))
+IDEA_MMR_LAMBDA = float(os.getenv("BUDDY_IDEA_MMR_LAMBDA", "0.7"))
+# Stage instrumentation. Metrics are collected when enabled, and served in the
+# Prometheus text format on BUDDY_METRICS_PORT when a port is set.
+METRICS_PORT = int(os.getenv("BUDDY_METRICS_PORT", "0"))
+METRICS_ENABLED = os.getenv("BUDDY_METRICS", "1" if METRICS_PORT else "0") == "1"
+
+# Generation parameters for each parameter profile
+MODEL_PARAMETERS = {
+    "Summary": {
+        "decoding_method": "sample",
+        "max_new_tokens": 550,  # Approx. 450 words
+        "min_new_tokens": 0,
+        "temperature": 0.7,
+        "top_k": 50,
+        "top_p": 0.9,
+        "repetition_penalty": 1
+    },
+    "ChunkSummary": {
+        "decoding_method": "sample",
+        "max_new_tokens": 200,
+        "min_new_tokens": 0,
+        "temperature": 0.7,
+        "top_k": 50,
+        "top_p": 0.9,
+        "repetition_penalty": 1
+    },
+    "HistorySummary": {
+        "decoding_method": "greedy",
+        "max_new_tokens": 200,
+        "min_new_tokens": 0,
+        "repetition_penalty": 1
+    },
+    "Creative": {
+        "decoding_method": "sample",
+        "max_new_tokens": 300,
+        "min_new_tokens": 0,
+        "temperature": 1.2,
+        "top_k": 75,
+        "top_p": 1.0,
+        "repetition_penalty": 1
+    },
+    "Diverse": {
+        "decoding_method": "sample",
+        "max_new_tokens": 300,
+        "min_new_tokens": 0,
+        "temperature": 0.9,
+        "top_k": 60,
+        "top_p": 0.9,
+        "repetition_penalty": 1
+    },
+    "Lateral": {
+        "decoding_method": "sample",
+        "max_new_tokens": 300,
+        "min_new_tokens": 0,
+        "temperature": 1.0,
+        "top_k": 30,
+        "top_p": 1.0,
+        "repetition_penalty": 1
+    },
+    "Conversational": {
+        "decoding_method": "sample",
+        "max_new_tokens": 150,
+        "min_new_tokens": 0,
+        "temperature": 0.7,
+        "top_k": 50,
+        "top_p": 0.9,
+        "repetition_penalty": 1
+    },
+}
+# Multi-idea variants of the thinking modes: the same sampling, with room for a numbered
+# list of IDEAS_PER_CALL candidates of about IDEA_TOKENS each
+IDEA_TOKENS = 90
+MODEL_PARAMETERS.update({
+    f"{mode}Ideas": dict(MODEL_PARAMETERS[mode], max_new_tokens=IDEA_TOKENS * max(1, IDEAS_PER_CALL))
+    for mode in THINKING_MODES
+})
@@ -0,0 +1,54 @@
+import os
+import time
+from .caching import document_hash, get_summary_cache, lookup_summary, summary_cache_key
+from .config import SUMMARY_CONCURRENCY
+from .extraction import extract_clean_text
+from .metrics import get_metrics
+from .retrieval import get_index_store
+from .scheduler import get_scheduler
+from .summarization import summarize_document
+
+# Function to extract, summarize and index one document, reusing cached summaries and saved
+# indexes. progress, when given, is called with the name of each stage as it starts.
+def process_document(fileobj, name, stats=None, concurrency=SUMMARY_CONCURRENCY, progress=None):
+    stats = {} if stats is None else stats
+    progress = progress or (lambda stage: None)
+    start = time.perf_counter()
+    progress("reading")
+    with get_metrics().span("upload_read"):
+        document_bytes = fileobj.read()
+        fileobj.seek(0)
+    content_hash = document_hash(document_bytes)
+    cleaned_text = None
+    summary = lookup_summary(content_hash, len(document_bytes))
+    stats["summary_cached"] = summary is not None
+    if summary is None:
+        progress("extracting")
+        cleaned_text = extract_clean_text(fileobj, name, stats)
+        progress("summarizing")
+        # Sessions summarizing the same document at the same time share one run
+        summary = get_scheduler().coalesce(summary_cache_key(content_hash), lambda: summarize_document(cleaned_text, stats, concurrency))
+        if summary.startswith("Error generating summary"):
+            raise RuntimeError(summary)
+        get_summary_cache().put(summary_cache_key(content_hash), summary)
+    # Retrieval is optional: without an index, prompts use the summary alone
+    index_store = get_index_store()
+    indexed = False
+    if index_store is not None:
+        progress("indexing")
+        try:
+            index_store.ensure(content_hash, lambda: cleaned_text if cleaned_text is not None else extract_clean_text(fileobj, name))
+            indexed = True
+        except Exception as e:
+            stats["index_error"] = str(e)
+    stats["processing_time"] = time.perf_counter() - start
+    return {"name": name, "hash": content_hash, "summary": summary, "indexed": indexed}
+
+# Function to list the PDF and text files in a folder (or a single file)
+def find_documents(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.lower().endswith((".pdf", ".txt"))
+    )
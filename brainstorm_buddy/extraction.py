@@ -0,0 +1,195 @@
+import io
+import os
+import re
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from .metrics import get_metrics
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# PDFs with at least this many pages are extracted across a process pool
+PARALLEL_EXTRACTION_MIN_PAGES = int(os.getenv("BUDDY_PARALLEL_EXTRACTION_MIN_PAGES", "40"))
+EXTRACTION_WORKERS = int(os.getenv("BUDDY_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_BATCH_PAGES = 20
+TEXT_READ_CHARS = 64 * 1024
+# Rough characters-per-token ratio used for prompt budgeting
+CHARS_PER_TOKEN = 4
+
+# clean_pdf_text placeholder for newlines after list markers. The old chained
+# regexes turned it back into a newline, which the final whitespace collapse
+# then folded into a space, so the only lasting effect is that a literal
+# occurrence in the document text is treated as whitespace.
+PRESERVE_NEWLINE = "__PRESERVE_NEWLINE__"
+_NORMALIZE_RE = re.compile(r"(?:\s|" + PRESERVE_NEWLINE + r")+")
+# A run or placeholder can continue past the end of a piece by at most this many characters
+_NORMALIZE_HOLDBACK = len(PRESERVE_NEWLINE) - 1
+
+# Document bytes for the current worker process, set once by the pool initializer
+_worker_document = None
+
+def _init_worker(document_bytes):
+    global _worker_document
+    _worker_document = document_bytes
+
+# Function to extract a range of pages inside a worker process
+def _extract_page_range(page_range):
+    start, stop = page_range
+    reader = PdfReader(io.BytesIO(_worker_document))
+    results = []
+    for index in range(start, stop):
+        page_start = time.perf_counter()
+        text = reader.pages[index].extract_text() or ""
+        results.append((text, time.perf_counter() - page_start))
+    return results
+
+# Function to yield page texts of a PDF in page order, in a process pool for large files
+def iter_pdf_pages(fileobj, stats, workers=EXTRACTION_WORKERS, min_parallel_pages=PARALLEL_EXTRACTION_MIN_PAGES):
+    reader = PdfReader(fileobj)
+    page_count = len(reader.pages)
+    stats["pages"] = page_count
+    stats.setdefault("page_times", [])
+    if workers > 1 and page_count >= min_parallel_pages:
+        stats["workers"] = workers
+        fileobj.seek(0)
+        document_bytes = fileobj.read()
+        ranges = [(start, min(start + EXTRACTION_BATCH_PAGES, page_count)) for start in range(0, page_count, EXTRACTION_BATCH_PAGES)]
+        # spawn keeps the workers independent of the (threaded) Streamlit server process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(document_bytes,)) as pool:
+            for results in pool.map(_extract_page_range, ranges):
+                for text, elapsed in results:
+                    stats["page_times"].append(elapsed)
+                    yield text
+    else:
+        stats["workers"] = 1
+        for page in reader.pages:
+            page_start = time.perf_counter()
+            text = page.extract_text() or ""
+            stats["page_times"].append(time.perf_counter() - page_start)
+            yield text
+
+# Function to yield a text file in fixed-size pieces without loading it all at once
+def iter_text_file(fileobj, stats, encoding="utf-8"):
+    fileobj.seek(0)
+    reader = io.TextIOWrapper(fileobj, encoding=encoding, errors="replace", newline="")
+    try:
+        while True:
+            chunk = reader.read(TEXT_READ_CHARS)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        # Hand the underlying file back instead of closing it with the wrapper
+        reader.detach()
+    stats["pages"] = 0
+    stats["workers"] = 1
+
+# Function to yield the text of an uploaded PDF or text file piece by piece
+def iter_document_text(fileobj, name, stats):
+    if name.lower().endswith(".txt"):
+        return iter_text_file(fileobj, stats)
+    return iter_pdf_pages(fileobj, stats)
+
+# Function to clean extracted PDF text in a single pass
+def clean_pdf_text(text):
+    return _NORMALIZE_RE.sub(" ", text).strip()
+
+# Incremental version of clean_pdf_text for text that arrives in pieces (for example
+# page by page). Joining the output of feed() and finish() gives exactly
+# clean_pdf_text of the joined input.
+class TextNormalizer:
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def _emit(self, text):
+        text = _NORMALIZE_RE.sub(" ", text)
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, piece):
+        buffer = self._pending + piece
+        # Hold back the tail that a following piece could still change: a possible
+        # placeholder prefix, and any whitespace run reaching into that tail
+        cut = max(0, len(buffer) - _NORMALIZE_HOLDBACK)
+        for match in _NORMALIZE_RE.finditer(buffer):
+            if match.start() >= cut:
+                break
+            if match.end() >= cut:
+                cut = match.start()
+                break
+        self._pending = buffer[cut:]
+        return self._emit(buffer[:cut])
+
+    def finish(self):
+        text = self._emit(self._pending).rstrip()
+        self._pending = ""
+        return text
+
+# Function to yield cleaned text as the document is extracted
+def iter_clean_text(pieces, stats):
+    normalizer = TextNormalizer()
+    stats.setdefault("cleaning_time", 0.0)
+    for piece in pieces:
+        start = time.perf_counter()
+        cleaned = normalizer.feed(piece)
+        stats["cleaning_time"] += time.perf_counter() - start
+        if cleaned:
+            yield cleaned
+    yield normalizer.finish()
+
+# Function to approximate the token count of a text
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+# Function to split cleaned text into overlapping, token-budgeted chunks on word boundaries
+def chunk_text(text, max_tokens, overlap_tokens=0):
+    words = text.split(" ")
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = start
+        size = 0
+        while end < len(words) and (end == start or size + len(words[end]) + 1 <= max_chars):
+            size += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back far enough to carry overlap_chars into the next chunk
+        next_start = end
+        carried = 0
+        while next_start > start + 1 and carried < overlap_chars:
+            next_start -= 1
+            carried += len(words[next_start]) + 1
+        start = next_start
+    return chunks
+
+# Function to report the peak resident set size of this process and its workers, in bytes
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+# Function to extract and clean a document in one streaming pass, so the raw text is never held in full
+def extract_clean_text(fileobj, name, stats=None):
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    text = "".join(iter_clean_text(iter_document_text(fileobj, name, stats), stats))
+    stats["extraction_time"] = time.perf_counter() - start - stats["cleaning_time"]
+    stats["peak_rss"] = peak_rss_bytes()
+    metrics = get_metrics()
+    metrics.record("page_extraction", stats["extraction_time"])
+    metrics.record("cleaning", stats["cleaning_time"])
+    return text
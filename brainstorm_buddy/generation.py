@@ -0,0 +1,193 @@
+import hashlib
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .assembly import assemble_prompt, conversation_context
+from .caching import DEFAULT_CACHED_MODES, lookup_response, store_response
+from .clients import get_client_registry
+from .config import STREAMING_ENABLED, THINKING_MODES, model_id
+from .extraction import estimate_tokens
+from .metrics import get_metrics
+from .resilience import DeadlineExceeded, get_resilient_caller, status_code
+from .retrieval import retrieve_excerpts
+from .scheduler import INTERACTIVE, get_scheduler, priority_for
+
+# Function to derive the coalescing key of a blocking model request
+def request_key(profile, prompt):
+    return hashlib.sha256(f"{model_id}|{profile}|{prompt}".encode("utf-8")).hexdigest()
+
+# Function to generate text in one blocking call through the shared scheduler,
+# within the profile's deadline and with retries (and hedging, for interactive
+# calls) from the resilient caller. Identical requests in flight are coalesced.
+# Token counts reported by the service and the time spent queued are recorded
+# in timings when given.
+def generate(profile, prompt, timings=None, priority=None):
+    start = time.perf_counter()
+    scheduler = get_scheduler()
+    priority = priority_for(profile) if priority is None else priority
+
+    def call_model(cancelled):
+        with scheduler.slot(priority, profile, cancelled) as waited:
+            if cancelled.is_set():
+                raise DeadlineExceeded("Abandoned while queued")
+            if timings is not None:
+                timings["queue_wait"] = waited
+            with get_metrics().span("model_call", profile) as record:
+                model = get_client_registry().get(profile)
+                response = model.generate_text(prompt=prompt, guardrails=True, raw_response=True)
+                result = response["results"][0]
+                record["input_tokens"] = result.get("input_token_count", 0)
+                record["output_tokens"] = result.get("generated_token_count", 0)
+        return result
+
+    caller = get_resilient_caller()
+    result = scheduler.coalesce(
+        request_key(profile, prompt),
+        lambda: caller.call(profile, call_model, hedge=priority == INTERACTIVE, timings=timings)
+    )
+    if timings is not None:
+        timings["total_time"] = time.perf_counter() - start
+        timings["input_tokens"] = result.get("input_token_count", 0)
+        timings["generated_tokens"] = result.get("generated_token_count", 0)
+    return result["generated_text"]
+
+# Function to fetch document excerpts for the thinking modes (the conversational prompt does not use them)
+def excerpts_for(user_question, thinking_mode, document_hash):
+    if not thinking_mode:
+        return None
+    return retrieve_excerpts(document_hash, user_question)
+
+# Function to fetch excerpts and assemble the token-budgeted prompt for a chat turn,
+# returning (profile, prompt). Tokens per prompt section are recorded in timings.
+def prepare_prompt(user_question, thinking_mode=None, chat_history=None, document_summary="", document_hash=None, memory=None, timings=None):
+    with get_metrics().span("prompt_build", thinking_mode or "Conversational"):
+        excerpts = excerpts_for(user_question, thinking_mode, document_hash)
+        profile, prompt, report = assemble_prompt(user_question, thinking_mode, chat_history, document_summary, excerpts, memory)
+    if timings is not None:
+        timings["prompt_tokens"] = report
+    return profile, prompt
+
+# Function to fold older messages into the session's rolling conversation summary once
+# enough have built up. Raises when the summary call fails; the fold is retried next turn.
+def compact_conversation(memory, chat_history):
+    if memory is None or not memory.needs_fold(chat_history):
+        return False
+    stop, prompt = memory.fold_prompt(chat_history)
+    memory.apply_fold(generate("HistorySummary", prompt), stop)
+    return True
+
+# Function to get AI response from Granite model
+def get_ai_response(user_question, thinking_mode=None, chat_history=None, document_summary="", document_hash=None, timings=None, memory=None):
+    try:
+        profile, prompt = prepare_prompt(user_question, thinking_mode, chat_history, document_summary, document_hash, memory, timings)
+        return generate(profile, prompt, timings)
+    except Exception as e:
+        if timings is not None:
+            timings["error"] = type(e).__name__
+        return f"Error generating response: {str(e)}"
+
+# Function to open a token stream, or None when streaming is unavailable: disabled, not
+# offered by the client, or the stream endpoint is missing (404). Any other error is
+# raised, so it is retried (or not) once instead of being sent again as a blocking call.
+def open_text_stream(model, prompt):
+    if not STREAMING_ENABLED or not hasattr(model, "generate_text_stream"):
+        return None
+    try:
+        chunks = model.generate_text_stream(prompt=prompt, guardrails=True)
+        # The request is only sent once the generator is first advanced
+        first_chunk = next(chunks, "")
+    except NotImplementedError:
+        return None
+    except Exception as e:
+        if status_code(e) == 404:
+            return None
+        raise
+    return itertools.chain([first_chunk], chunks)
+
+# Function to stream generated text chunk by chunk, falling back to a blocking call.
+# The scheduler slot is held until the stream ends, and the whole stream must finish
+# within the profile's deadline. Time to first token and total time are recorded in
+# timings. The stream carries no token counts, so the model_call metrics use
+# estimates for streamed replies.
+def stream_text(profile, prompt, timings, label="response", priority=None):
+    start = time.perf_counter()
+    timings["streamed"] = False
+    timings["queue_wait"] = 0.0
+    generated = []
+    priority = priority_for(profile) if priority is None else priority
+
+    def open_chunks(cancelled):
+        with get_scheduler().slot(priority, profile, cancelled) as waited:
+            if cancelled.is_set():
+                return
+            timings["queue_wait"] = waited
+            model = get_client_registry().get(profile)
+            chunks = open_text_stream(model, prompt)
+            if chunks is not None:
+                timings["streamed"] = True
+            else:
+                chunks = [model.generate_text(prompt=prompt, guardrails=True)]
+            yield from chunks
+
+    try:
+        for chunk in get_resilient_caller().stream(profile, open_chunks, hedge=priority == INTERACTIVE, timings=timings):
+            if not chunk:
+                continue
+            if "time_to_first_token" not in timings:
+                timings["time_to_first_token"] = time.perf_counter() - start
+            generated.append(chunk)
+            yield chunk
+    except Exception as e:
+        timings["error"] = type(e).__name__
+        # Keep the error apart from any partial text already streamed
+        separator = "\n\n" if generated else ""
+        yield f"{separator}Error generating {label}: {str(e)}"
+    timings["total_time"] = time.perf_counter() - start
+    get_metrics().record(
+        "model_call", timings["total_time"] - timings["queue_wait"], mode=profile, error=timings.get("error"),
+        input_tokens=estimate_tokens(prompt), output_tokens=estimate_tokens("".join(generated))
+    )
+
+# Function to stream an AI response for a chat turn
+def stream_ai_response(user_question, thinking_mode, chat_history, timings, document_summary="", document_hash=None, memory=None):
+    profile, prompt = prepare_prompt(user_question, thinking_mode, chat_history, document_summary, document_hash, memory, timings)
+    return stream_text(profile, prompt, timings)
+
+# Function to generate a blocking reply, returning it with its timings
+def generate_timed(profile, prompt):
+    timings = {"streamed": False}
+    start = time.perf_counter()
+    try:
+        response = generate(profile, prompt, timings)
+    except Exception as e:
+        response = f"Error generating response: {str(e)}"
+        timings["error"] = type(e).__name__
+        timings["total_time"] = time.perf_counter() - start
+    return response, timings
+
+# Function to ask every thinking mode concurrently, yielding (mode, response, timings)
+# as each reply arrives, so the wall time is close to the slowest mode
+def compare_thinking_modes(user_question, chat_history=None, document_summary="", document_hash=None, cached_modes=DEFAULT_CACHED_MODES, memory=None):
+    with get_metrics().span("prompt_build", "Compare"):
+        excerpts = retrieve_excerpts(document_hash, user_question)
+        # Taken before any reply is yielded, as the UI adds replies to the history as they arrive
+        conversation = conversation_context(user_question, chat_history, memory)
+    requests = {}
+    for mode in THINKING_MODES:
+        cached = lookup_response(user_question, mode, document_summary, cached_modes, conversation)
+        if cached is not None:
+            yield mode, cached["response"], {"cached": True, "saved_time": cached["generation_time"]}
+            continue
+        with get_metrics().span("prompt_build", mode):
+            requests[mode] = assemble_prompt(user_question, mode, chat_history, document_summary, excerpts, memory)
+    if not requests:
+        return
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        futures = {pool.submit(generate_timed, profile, prompt): mode for mode, (profile, prompt, _) in requests.items()}
+        for future in as_completed(futures):
+            mode = futures[future]
+            response, timings = future.result()
+            timings["prompt_tokens"] = requests[mode][2]
+            if not timings.get("error"):
+                store_response(user_question, mode, response, timings["total_time"], document_summary, cached_modes, conversation)
+            yield mode, response, timings
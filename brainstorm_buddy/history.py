@@ -0,0 +1,82 @@
+import os
+import json
+import sqlite3
+import time
+from collections.abc import Sequence
+from contextlib import closing
+from .config import CACHE_DIR, HISTORY_MEMORY_MESSAGES, SESSION_HISTORY_TTL
+
+# Chat history of one session. The latest messages live in memory; once more than
+# twice keep_messages build up, the older ones are moved in one batch to a SQLite
+# file and read back only when a slice reaches into them. Indexing, slicing and
+# len() use absolute message positions, so callers can treat it as a list.
+class ChatHistory(Sequence):
+    def __init__(self, path, keep_messages=HISTORY_MEMORY_MESSAGES):
+        self.path = path
+        self.keep_messages = keep_messages
+        self._recent = []
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS messages (position INTEGER PRIMARY KEY, message TEXT NOT NULL)")
+            connection.commit()
+            # Number of leading messages held in the store
+            self.offloaded = connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def __len__(self):
+        return self.offloaded + len(self._recent)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.messages(0, len(self))[index]
+            return self.messages(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chat history index out of range")
+        return self.messages(index, index + 1)[0]
+
+    def __iter__(self):
+        return iter(self.messages(0, len(self)))
+
+    # Function to get messages start..stop, reading the stored part in one query
+    def messages(self, start, stop):
+        stored = []
+        if start < min(stop, self.offloaded):
+            with closing(sqlite3.connect(self.path)) as connection:
+                rows = connection.execute(
+                    "SELECT message FROM messages WHERE position >= ? AND position < ? ORDER BY position",
+                    (start, min(stop, self.offloaded))
+                ).fetchall()
+            stored = [json.loads(row[0]) for row in rows]
+        return stored + self._recent[max(0, start - self.offloaded):max(0, stop - self.offloaded)]
+
+    def append(self, message):
+        self._recent.append(message)
+        if len(self._recent) > 2 * self.keep_messages:
+            self._offload(len(self._recent) - self.keep_messages)
+
+    def _offload(self, count):
+        rows = [(self.offloaded + index, json.dumps(message)) for index, message in enumerate(self._recent[:count])]
+        with closing(sqlite3.connect(self.path)) as connection:
+            connection.executemany("INSERT OR REPLACE INTO messages (position, message) VALUES (?, ?)", rows)
+            connection.commit()
+        del self._recent[:count]
+        self.offloaded += count
+
+# Function to delete session stores that have not been written to within max_age seconds
+def prune_session_stores(directory, max_age=SESSION_HISTORY_TTL):
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".sqlite3") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+# Function to open the chat history store for a session, pruning stale ones
+def open_session_history(session_id, directory=os.path.join(CACHE_DIR, "sessions")):
+    os.makedirs(directory, exist_ok=True)
+    prune_session_stores(directory)
+    return ChatHistory(os.path.join(directory, f"{session_id}.sqlite3"))
@@ -0,0 +1,133 @@
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .assembly import assemble_prompt
+from .config import IDEA_COUNT_MAX, IDEA_DUPLICATE_SIMILARITY, IDEA_MMR_LAMBDA, IDEA_OVERSAMPLE, IDEAS_PER_CALL
+from .generation import excerpts_for, generate
+from .metrics import get_metrics
+from .prompts import build_ideas_prompt
+from .retrieval import get_index_store
+
+# A numbered ("1." or "1)") or bulleted list item at the start of a line
+LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+WORD = re.compile(r"[a-z0-9']+")
+# Shortest list item, in words, kept as an idea
+MIN_IDEA_WORDS = 3
+
+# Function to split a list reply into ideas; lines that are not list items continue the
+# idea above. A reply that is not a list at all is kept as one idea.
+def parse_ideas(text):
+    ideas = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if LIST_ITEM.match(line):
+            ideas.append(LIST_ITEM.sub("", line))
+        elif ideas:
+            ideas[-1] += " " + line
+    if not ideas and text.strip():
+        return [text.strip()]
+    return [idea.strip() for idea in ideas if len(idea.split()) >= MIN_IDEA_WORDS]
+
+# Function to compute pairwise similarities of texts, returning (matrix, method): cosine
+# of the local retrieval embeddings when available, otherwise word-set (Jaccard) overlap
+def similarity_matrix(texts):
+    index_store = get_index_store()
+    if index_store is not None:
+        try:
+            embeddings = index_store.embed(texts)
+            return (embeddings @ embeddings.T).tolist(), "embedding"
+        except Exception:
+            pass
+    words = [set(WORD.findall(text.lower())) for text in texts]
+    return [[len(a & b) / len(a | b) if a | b else 0.0 for b in words] for a in words], "jaccard"
+
+# Function to drop near-duplicate ideas and pick up to count of the rest by maximal
+# marginal relevance: each pick trades relevance to reference against similarity to
+# the ideas already picked. Returns (ranked ideas, duplicates dropped, similarity method).
+def rank_ideas(ideas, reference, count, duplicate_similarity=IDEA_DUPLICATE_SIMILARITY, mmr_lambda=IDEA_MMR_LAMBDA):
+    if not ideas:
+        return [], 0, None
+    similarity, method = similarity_matrix(ideas + [reference])
+    relevance = similarity[-1]
+    # Earlier ideas win ties with their near-duplicates
+    distinct = []
+    for index in range(len(ideas)):
+        if all(similarity[index][kept] < duplicate_similarity for kept in distinct):
+            distinct.append(index)
+    selected = []
+    while distinct and len(selected) < count:
+        best = max(distinct, key=lambda index: mmr_lambda * relevance[index] - (1 - mmr_lambda) * max((similarity[index][picked] for picked in selected), default=0.0))
+        selected.append(best)
+        distinct.remove(best)
+    ranked = [{"text": ideas[index], "relevance": relevance[index]} for index in selected]
+    return ranked, len(ideas) - len(distinct) - len(selected), method
+
+# Function to render ranked ideas as a numbered Markdown list
+def format_ideas(ideas):
+    return "\n".join(f"{number}. {idea['text']}" for number, idea in enumerate(ideas, 1))
+
+# Function to split candidates into the list sizes asked of each concurrent model call
+def plan_calls(candidates, per_call=IDEAS_PER_CALL):
+    calls = math.ceil(candidates / max(1, per_call))
+    return [candidates // calls + (1 if index < candidates % calls else 0) for index in range(calls)]
+
+# Function to get count ideas from a thinking mode. A few extra candidates are asked
+# for, as numbered lists from at most IDEAS_PER_CALL-sized model calls run
+# concurrently, so a request costs one round of calls that share the prompt context
+# instead of one call per idea. Candidates are deduplicated and ranked locally against
+# the question and document summary. Tokens and time per idea are recorded in timings.
+def generate_ideas(user_question, thinking_mode, count, chat_history=None, document_summary="", document_hash=None, memory=None, timings=None):
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    count = max(1, min(count, IDEA_COUNT_MAX))
+    sizes = plan_calls(max(count, math.ceil(count * IDEA_OVERSAMPLE)))
+    requests = []
+    with get_metrics().span("prompt_build", f"{thinking_mode}Ideas"):
+        excerpts = excerpts_for(user_question, thinking_mode, document_hash)
+        first = 1
+        for size in sizes:
+            # Each call numbers its list from a different point, which also keeps the
+            # prompts distinct so the scheduler does not coalesce them into one call
+            def build(question, mode, history, summary, excerpts, conversation, size=size, first=first):
+                return build_ideas_prompt(question, mode, size, summary, excerpts, conversation, first)
+            requests.append(assemble_prompt(user_question, thinking_mode, chat_history, document_summary, excerpts, memory, build=build))
+            first += size
+    timings["prompt_tokens"] = requests[0][2]
+
+    def call(request):
+        profile, prompt, _ = request
+        call_timings = {}
+        return generate(profile, prompt, call_timings), call_timings
+
+    replies = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        for future in [pool.submit(call, request) for request in requests]:
+            try:
+                replies.append(future.result())
+            except Exception as e:
+                errors.append(e)
+    # Ideas from the calls that succeeded are still worth showing
+    if not replies:
+        raise errors[0]
+    timings["calls"] = len(requests)
+    timings["failed_calls"] = len(errors)
+    timings["queue_wait"] = max(call_timings.get("queue_wait", 0.0) for _, call_timings in replies)
+    timings["input_tokens"] = sum(call_timings.get("input_tokens", 0) for _, call_timings in replies)
+    timings["generated_tokens"] = sum(call_timings.get("generated_tokens", 0) for _, call_timings in replies)
+    ranking_start = time.perf_counter()
+    parsed = [idea for reply, _ in replies for idea in parse_ideas(reply)]
+    ideas, duplicates, method = rank_ideas(parsed, f"{user_question}\n{document_summary}", count)
+    timings["ranking_time"] = time.perf_counter() - ranking_start
+    timings["total_time"] = time.perf_counter() - start
+    timings["ideas"] = len(ideas)
+    timings["candidates"] = len(parsed)
+    timings["duplicates"] = duplicates
+    timings["similarity"] = method
+    if ideas:
+        timings["tokens_per_idea"] = (timings["input_tokens"] + timings["generated_tokens"]) / len(ideas)
+        timings["time_per_idea"] = timings["total_time"] / len(ideas)
+    return ideas
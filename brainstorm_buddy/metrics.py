@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_ENABLED, METRICS_PORT
+
+# Pipeline stages that are timed
+STAGES = ["upload_read", "page_extraction", "cleaning", "cache_lookup", "prompt_build", "queue_wait", "model_call", "render"]
+# Histogram bucket upper bounds, in seconds
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+# Recent durations kept per (stage, mode) for the diagnostics panel percentiles
+RECENT_SAMPLES = 500
+RECENT_EVENTS = 50
+
+# Times a block of code as one stage observation. The dict returned on entry
+# collects extra labels and counts (cache, error, input_tokens, output_tokens);
+# an exception leaving the block is recorded as the error class and re-raised.
+class StageTimer:
+    __slots__ = ("metrics", "stage", "record", "start")
+
+    def __init__(self, metrics, stage, mode, cache):
+        self.metrics = metrics
+        self.stage = stage
+        self.record = {"mode": mode, "cache": cache}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.metrics.record(self.stage, time.perf_counter() - self.start, **self.record)
+        return False
+
+# Thread-safe store of stage durations, token counts and errors
+class Metrics:
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (stage, mode, cache) -> [bucket counts..., sum, count]
+        self._durations = {}
+        # (stage, mode, error) -> count
+        self._errors = {}
+        # (stage, mode, direction) -> tokens
+        self._tokens = {}
+        self._recent = {}
+        # name -> (help text, function returning the current value)
+        self._gauges = {}
+        self.events = deque(maxlen=RECENT_EVENTS)
+        self.server_address = None
+        self.server_error = None
+
+    def span(self, stage, mode=None, cache=None):
+        return StageTimer(self, stage, mode, cache)
+
+    # Function to register a gauge whose value is read when metrics are rendered
+    def add_gauge(self, name, help_text, function):
+        with self._lock:
+            self._gauges[name] = (help_text, function)
+
+    def record(self, stage, duration, mode=None, cache=None, error=None, input_tokens=None, output_tokens=None):
+        mode = mode or ""
+        cache = cache or ""
+        with self._lock:
+            key = (stage, mode, cache)
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = [0] * (len(DURATION_BUCKETS) + 2)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[index] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+            recent = self._recent.get((stage, mode))
+            if recent is None:
+                recent = self._recent[(stage, mode)] = deque(maxlen=RECENT_SAMPLES)
+            recent.append(duration)
+            if error:
+                self._errors[(stage, mode, error)] = self._errors.get((stage, mode, error), 0) + 1
+            for direction, tokens in (("input", input_tokens), ("output", output_tokens)):
+                if tokens:
+                    self._tokens[(stage, mode, direction)] = self._tokens.get((stage, mode, direction), 0) + tokens
+            self.events.append({
+                "time": time.time(), "stage": stage, "mode": mode, "cache": cache, "duration": duration,
+                "error": error, "input_tokens": input_tokens, "output_tokens": output_tokens,
+            })
+
+    # Function to summarize each (stage, mode) for display: count, errors, p50/p95 and tokens
+    def stage_summary(self):
+        with self._lock:
+            rows = []
+            for (stage, mode), recent in self._recent.items():
+                ordered = sorted(recent)
+                count = sum(h[-1] for (s, m, _), h in self._durations.items() if s == stage and m == mode)
+                rows.append({
+                    "stage": stage,
+                    "mode": mode,
+                    "count": count,
+                    "errors": sum(n for (s, m, _), n in self._errors.items() if s == stage and m == mode),
+                    "p50_s": ordered[int(0.50 * (len(ordered) - 1))],
+                    "p95_s": ordered[int(0.95 * (len(ordered) - 1))],
+                    "input_tokens": self._tokens.get((stage, mode, "input"), 0),
+                    "output_tokens": self._tokens.get((stage, mode, "output"), 0),
+                })
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        return sorted(rows, key=lambda row: (order.get(row["stage"], len(order)), row["mode"]))
+
+    # Function to render all metrics in the Prometheus text exposition format
+    def render_prometheus(self):
+        with self._lock:
+            durations = {key: list(value) for key, value in self._durations.items()}
+            errors = dict(self._errors)
+            tokens = dict(self._tokens)
+            gauges = dict(self._gauges)
+        lines = [
+            "# HELP buddy_stage_duration_seconds Time spent in each pipeline stage.",
+            "# TYPE buddy_stage_duration_seconds histogram",
+        ]
+        for (stage, mode, cache), histogram in sorted(durations.items()):
+            labels = format_labels(stage=stage, mode=mode, cache=cache)
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(f'buddy_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'buddy_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"buddy_stage_duration_seconds_sum{{{labels}}} {histogram[-2]}")
+            lines.append(f"buddy_stage_duration_seconds_count{{{labels}}} {histogram[-1]}")
+        lines += [
+            "# HELP buddy_stage_errors_total Failed stage runs by error class.",
+            "# TYPE buddy_stage_errors_total counter",
+        ]
+        for (stage, mode, error), count in sorted(errors.items()):
+            lines.append(f"buddy_stage_errors_total{{{format_labels(stage=stage, mode=mode, error=error)}}} {count}")
+        lines += [
+            "# HELP buddy_tokens_total Model tokens processed, by direction.",
+            "# TYPE buddy_tokens_total counter",
+        ]
+        for (stage, mode, direction), count in sorted(tokens.items()):
+            lines.append(f"buddy_tokens_total{{{format_labels(stage=stage, mode=mode, direction=direction)}}} {count}")
+        for name, (help_text, function) in sorted(gauges.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {function()}"]
+        return "\n".join(lines) + "\n"
+
+# Stand-in used when metrics are disabled; every call is a constant-time no-op
+class NullMetrics:
+    enabled = False
+    events = ()
+    server_address = None
+    server_error = None
+
+    def span(self, stage, mode=None, cache=None):
+        return _NULL_TIMER
+
+    def add_gauge(self, name, help_text, function):
+        pass
+
+    def record(self, stage, duration, **labels):
+        pass
+
+    def stage_summary(self):
+        return []
+
+    def render_prometheus(self):
+        return ""
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_NULL_TIMER = NullTimer()
+
+# Function to escape and join Prometheus label pairs
+def format_labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+
+# Function to serve /metrics from a daemon thread, returning the bound address
+def start_metrics_server(metrics, port, host="127.0.0.1"):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+# Function to get the process-wide metrics store, starting the endpoint on first use
+def get_metrics():
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            if not METRICS_ENABLED:
+                _metrics = NullMetrics()
+            else:
+                metrics = Metrics()
+                if METRICS_PORT:
+                    try:
+                        metrics.server_address = start_metrics_server(metrics, METRICS_PORT)
+                    except OSError as e:
+                        # Another process (e.g. a second Streamlit worker) may hold the port
+                        metrics.server_error = str(e)
+                _metrics = metrics
+        return _metrics
@@ -0,0 +1,171 @@
+# Function to build the document summary prompt
+def build_summary_prompt(cleaned_text):
+    return (
+        "You are an AI Brainstorming Buddy powered by IBM Granite. Analyze the following business meeting notes related to soap marketing. "
+        "Summarize the key information in a concise, structured format using bullet points, optimized for further brainstorming. Include:\n\n"
+        "- What the Meeting Highlights About: Key themes, focus areas, or insights from the discussion (e.g., branding trends, target audience preferences, or promotional opportunities).\n"
+        "- Key Discussion Points: Main issues or topics discussed, in brief.\n"
+        "- Decisions Made: Any conclusions or agreements reached, in brief.\n"
+        "- Action Items: Specific tasks assigned or next steps, in brief.\n"
+        "- Important Insights: Key takeaways relevant to soap marketing, in brief.\n\n"
+        "Limit the summary to a maximum of 200 words. Use concise, actionable points that are clear and suitable for brainstorming marketing strategies. "
+        "Text to summarize: {cleaned_text}"
+        "start by Summary:"
+    ).format(**{"cleaned_text": cleaned_text})
+
+# Function to build the summary prompt for one chunk of a long document
+def build_chunk_summary_prompt(chunk, index, total):
+    return (
+        "You are an AI Brainstorming Buddy powered by IBM Granite. The following text is part {index} of {total} of business meeting notes related to soap marketing. "
+        "Summarize this part in concise bullet points covering key themes, discussion points, decisions made, action items and important insights. "
+        "Limit the summary to a maximum of 120 words. "
+        "Text to summarize: {chunk}"
+        "start by Summary:"
+    ).format(**{"index": index, "total": total, "chunk": chunk})
+
+# Function to format retrieved chunks as a prompt section
+def format_excerpts(excerpts):
+    if not excerpts:
+        return ""
+    return "Relevant excerpts from the user’s document:\n" + "\n".join(f"- {excerpt}" for excerpt in excerpts) + "\n\n"
+
+# Function to build the prompt that folds older chat messages into the rolling conversation summary
+def build_history_summary_prompt(previous_summary, conversation):
+    return (
+        "You are an AI Brainstorming Buddy powered by IBM Granite. Update the running summary of a brainstorming conversation. "
+        "Keep the user’s goals, the ideas already suggested, and any preferences, decisions or open questions, in a few concise sentences. "
+        "Limit the summary to a maximum of 120 words.\n\n"
+        "Summary so far: {previous_summary}\n\n"
+        "New messages:\n{conversation}\n\n"
+        "Updated summary:"
+    ).format(**{"previous_summary": previous_summary or "None yet.", "conversation": conversation})
+
+# Function to format chat messages, after the rolling summary of earlier ones, as prompt text
+def format_conversation(history_summary, messages):
+    lines = []
+    if history_summary:
+        lines.append(f"Earlier in the conversation: {history_summary}")
+    for message in messages:
+        if message["role"] == "user":
+            lines.append(f"User: {message['content']}")
+        elif message.get("thinking_mode"):
+            lines.append(f"Assistant ({message['thinking_mode']}): {message['content']}")
+        else:
+            lines.append(f"Assistant: {message['content']}")
+    return "\n".join(lines)
+
+# Function to format the conversation as a prompt section
+def format_conversation_section(conversation):
+    if not conversation:
+        return ""
+    return "Conversation so far:\n" + conversation + "\n\n"
+
+# Function to build the parameter profile and prompt for a chat turn. conversation is
+# assembled history text (see assembly.py); without it the conversational prompt
+# falls back to the last message pair.
+def build_prompt(user_question, thinking_mode=None, chat_history=None, document_summary="", excerpts=None, conversation=None):
+    # Pick mode-specific parameters and prompt
+    if thinking_mode:
+        document_excerpts = format_excerpts(excerpts)
+        conversation_section = format_conversation_section(conversation)
+        
+        if thinking_mode == "Creative":
+            profile = "Creative"
+            prompt = f"""
+                You are an AI Brainstorming Buddy powered by IBM Granite.
+
+                Below is a concise summary of the user’s document:
+                {document_summary if document_summary else "No summary provided."}
+
+                {document_excerpts}
+                {conversation_section}
+                Task:
+                Based on the above summary, suggest just one highly creative and original idea in response to the following question:
+
+                “{user_question}”
+
+                Instructions:
+                - Present your idea in a conversational, friendly, and professional tone.
+                - Naturally explain your thinking in 4–5 sentences, as if you’re chatting with the user and inviting their thoughts.
+                - Highlight how your idea addresses the user’s needs.
+                - Keep the whole response under 70 words.
+
+                Instead of a structured format, speak as if you’re brainstorming with the user and open to further discussion.
+            """
+        elif thinking_mode == "Diverse":
+            profile = "Diverse"
+            prompt = (
+                "You are an AI Brainstorming Buddy powered by IBM Granite.\n"
+                "Below is a concise summary of the user’s document:\n"
+                f"{document_summary if document_summary else 'No summary provided.'}\n\n"
+                f"{document_excerpts}"
+                f"{conversation_section}"
+                "Task:\n"
+                "Drawing from the summary, suggest just one practical idea for the user’s question that thoughtfully considers one of the diverse and multiple perspectives (e.g., different stakeholders, scenarios, or approaches, etc):\n"
+                f"“{user_question}”\n\n"
+                "Instructions:\n"
+                "- Share your idea in a friendly, conversational tone, as if you’re discussing options with the user.\n"
+                "- Explain within 10 sentences how you weighed different viewpoints and why this idea might work well from several angles.\n"
+                "- Invite the user to share their own perspective or ask questions.\n"
+                "- Keep the response under 100 words.\n\n"
+                "Instead of a structured format, speak as if you’re brainstorming with the user and open to further discussion."
+            )
+        elif thinking_mode == "Lateral":
+            profile = "Lateral"
+            prompt = (
+                "You are an AI Brainstorming Buddy powered by IBM Granite.\n"
+                "Below is a concise summary of the user’s document:\n"
+                f"{document_summary if document_summary else 'No summary provided.'}\n\n"
+                f"{document_excerpts}"
+                f"{conversation_section}"
+                "Task:\n"
+                "Based on the above summary, suggest one unique idea for the user’s question using the SCAMPER technique (Substitute, Combine, Adapt, Modify, Put to another use, Eliminate, Reverse). Choose the most relevant SCAMPER action and apply it creatively:\n"
+                f"“{user_question}”\n\n"
+                "Instructions:\n"
+                "- Weave the SCAMPER action you’re using naturally into your conversational explanation, without labeling it explicitly.\n"
+                "- Present your idea in a friendly, professional tone, as if you’re brainstorming together.\n"
+                "- In 8–10 sentences, explain how you came up with the idea and why it addresses the user’s needs, keeping the tone open and engaging.\n"
+                "- Keep the response under 100 words.\n\n"
+                "Avoid any headings, bullet points, or structured formatting-just a clear, natural conversation that invites the user to discuss or ask questions."
+
+            )
+        else:
+            raise ValueError(f"Unknown thinking mode: {thinking_mode}")
+    else:
+        # Mode B: Conversational
+        profile = "Conversational"
+        previous_messages = conversation or ""
+        if conversation is None and chat_history and len(chat_history) >= 2:
+            previous_messages = f"User: {chat_history[-2]['content']}\nAssistant: {chat_history[-1]['content']}"
+        prompt = (
+            "You are a conversational AI Brainstorming Assistant. Clarify or elaborate on the user’s question: {user_question}, "
+            "using the following previous messages for context: {previous_messages}. "
+            "Provide a clear, concise response within 100–200 words to deepen the discussion."
+        ).format(**{"user_question": user_question, "previous_messages": previous_messages if previous_messages else "No previous messages"})
+    return profile, prompt
+
+# What each thinking mode asks for when it suggests several ideas at once
+IDEA_STYLES = {
+    "Creative": "highly creative and original ideas, each taking a clearly different angle,",
+    "Diverse": "practical ideas, each from a different stakeholder, scenario or approach,",
+    "Lateral": "unique ideas, each applying a different SCAMPER action (Substitute, Combine, Adapt, Modify, Put to another use, Eliminate, Reverse),",
+}
+
+# Function to build the parameter profile and prompt asking a thinking mode for count
+# ideas in one reply, as a list numbered from first
+def build_ideas_prompt(user_question, thinking_mode, count, document_summary="", excerpts=None, conversation=None, first=1):
+    prompt = (
+        "You are an AI Brainstorming Buddy powered by IBM Granite.\n"
+        "Below is a concise summary of the user’s document:\n"
+        f"{document_summary if document_summary else 'No summary provided.'}\n\n"
+        f"{format_excerpts(excerpts)}"
+        f"{format_conversation_section(conversation)}"
+        "Task:\n"
+        f"Based on the above summary, suggest {count} {IDEA_STYLES[thinking_mode]} in response to the following question:\n"
+        f"“{user_question}”\n\n"
+        "Instructions:\n"
+        f"- Answer with a numbered list of {count} ideas, numbered {first} to {first + count - 1}, one per line, without any introduction or closing remarks.\n"
+        "- Start each idea with a short title, then explain in one or two sentences how it addresses the user’s needs.\n"
+        "- Keep each idea under 50 words, and make every idea clearly different from the others."
+    )
+    return f"{thinking_mode}Ideas", prompt
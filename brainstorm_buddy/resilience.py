@@ -0,0 +1,420 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from .config import (
+    BREAKER_FAILURES, BREAKER_RESET_SECONDS, HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES, HEDGING_ENABLED,
+    MODEL_DEADLINES, RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+from .metrics import get_metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+# HTTP statuses worth retrying: timeouts, throttling and gateway/server hiccups
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504, 520}
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+if httpx is not None:
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+if requests is not None:
+    TRANSIENT_ERRORS += (requests.ConnectionError, requests.Timeout)
+DEFAULT_DEADLINE = 30.0
+# Successful attempt durations kept per profile for the hedge delay
+RECENT_LATENCIES = 500
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitOpenError(Exception):
+    pass
+
+# Function to get the HTTP status carried by an SDK error, if any
+def status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+# Function to decide whether a failed model call may succeed if sent again
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) or status_code(error) in TRANSIENT_STATUS_CODES
+
+# Function to read a Retry-After header (in seconds) from an SDK error, if any
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return 0.0
+
+# Cancellation flag shared by the attempts of one call. Callbacks registered with
+# on_cancel run once when it is set, so an abandoned attempt can give back its
+# scheduler slot while its thread is still blocked in the SDK.
+class Cancellation:
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    # Function to run callback when the flag is set, or right away if it already is
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+# Function to run function(*args) on its own daemon thread, returning a Future.
+# Threads rather than a pool, so an abandoned call that never returns does not
+# hold up later ones; its scheduler slot is released through the Cancellation.
+def run_in_thread(function, *args):
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+# Fails fast while the model service is unhealthy. After failure_threshold
+# consecutive failures the circuit opens and calls are rejected; once
+# reset_timeout has passed a single probe is let through, which closes the
+# circuit on success or reopens it on failure.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.stats = {"opened": 0, "rejected": 0}
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # Function to let a call through, raising CircuitOpenError while the circuit is open
+    def admit(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.stats["rejected"] += 1
+        raise CircuitOpenError(f"Model service is unavailable; retrying in {max(remaining, 0):.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.stats["opened"] += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+# Bounds the time a model call can take. Each call gets its profile's deadline;
+# transient failures are retried with full-jitter exponential backoff while the
+# deadline allows, the circuit breaker short-circuits calls while the service is
+# failing, and (when hedging) a blocking call still running after the profile's
+# p95 latency, or a stream with no chunk after its p95 time to first chunk, is sent
+# again, taking whichever answer arrives first.
+class ResilientCaller:
+    def __init__(self, deadlines=MODEL_DEADLINES, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 breaker=None, hedging=HEDGING_ENABLED, hedge_min_samples=HEDGE_MIN_SAMPLES, hedge_min_delay=HEDGE_MIN_DELAY, seed=None):
+        self.deadlines = dict(deadlines)
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "hedges": 0, "hedge_wins": 0}
+        self._latencies = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def deadline_for(self, profile):
+        return self.deadlines.get(profile, DEFAULT_DEADLINE)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _observe(self, profile, duration):
+        with self._lock:
+            latencies = self._latencies.get(profile)
+            if latencies is None:
+                latencies = self._latencies[profile] = deque(maxlen=RECENT_LATENCIES)
+            latencies.append(duration)
+
+    # Function to get the delay before hedging a call, or None until there are enough samples
+    def hedge_delay(self, profile):
+        with self._lock:
+            latencies = sorted(self._latencies.get(profile, ()))
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, latencies[int(0.95 * (len(latencies) - 1))])
+
+    # Function to pick the pause before retry number attempt (1-based), honoring Retry-After
+    def backoff(self, attempt, error=None):
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(delay, retry_after(error))
+
+    # Function to run attempt(cancelled) once, timing successful runs for the hedge delay
+    def _timed(self, profile, attempt, cancelled):
+        start = time.monotonic()
+        result = attempt(cancelled)
+        self._observe(profile, time.monotonic() - start)
+        return result
+
+    # Function to run one attempt, plus a hedge if it is slow, until one succeeds,
+    # all fail, or the deadline passes
+    def _race(self, profile, attempt, deadline, hedge):
+        cancelled = Cancellation()
+        start = time.monotonic()
+        first = run_in_thread(self._timed, profile, attempt, cancelled)
+        pending = {first}
+        hedge_at = None
+        if hedge and self.hedging:
+            delay = self.hedge_delay(profile)
+            hedge_at = start + delay if delay is not None else None
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise DeadlineExceeded(f"No reply within {self.deadline_for(profile):g}s")
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    self._count("hedges")
+                    pending.add(run_in_thread(self._timed, profile, attempt, cancelled))
+                timeout = deadline - now if hedge_at is None else min(deadline, hedge_at) - now
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is not first:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+                # No hedge once the first attempt has failed; that is a retry's job
+                if error is not None:
+                    hedge_at = None
+            raise error
+        finally:
+            # Attempts still queued skip the model call; ones already running are abandoned
+            cancelled.set()
+
+    # Function to call attempt(cancelled) within the profile's deadline. attempt should
+    # make one model call, skip it when cancelled is set by then, and hand cancelled to
+    # the scheduler slot so an abandoned call does not keep its slot.
+    def call(self, profile, attempt, hedge=True, timings=None):
+        deadline = time.monotonic() + self.deadline_for(profile)
+        self._count("calls")
+        error = None
+        for number in range(self.attempts):
+            if number:
+                delay = self.backoff(number, error)
+                if time.monotonic() + delay >= deadline:
+                    break
+                self._count("retries")
+                if timings is not None:
+                    timings["retries"] = number
+                time.sleep(delay)
+            self.breaker.admit()
+            try:
+                result = self._race(profile, attempt, deadline, hedge)
+            except DeadlineExceeded:
+                self._count("timeouts")
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    # The service answered; the request itself was at fault
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                error = e
+                continue
+            self.breaker.record_success()
+            return result
+        self._count("failures")
+        raise error
+
+    # Function to stream the chunks of open_chunks(cancelled) within the profile's deadline.
+    # The stream is read on a separate thread so a stalled one is abandoned at the
+    # deadline. Transient failures are retried only until the first chunk arrives. When
+    # hedging, a stream with no chunk after the profile's p95 time to first chunk is
+    # opened again; the first to send a chunk is read and the other is cancelled.
+    def stream(self, profile, open_chunks, hedge=True, timings=None):
+        deadline = time.monotonic() + self.deadline_for(profile)
+        # Times to first chunk are kept apart from the durations of blocking calls
+        first_chunk_profile = f"{profile}Stream"
+        self._count("calls")
+        error = None
+        for number in range(self.attempts):
+            if number:
+                delay = self.backoff(number, error)
+                if time.monotonic() + delay >= deadline:
+                    break
+                self._count("retries")
+                if timings is not None:
+                    timings["retries"] = number
+                time.sleep(delay)
+            self.breaker.admit()
+            items = queue.Queue()
+            # Cancellation of each stream opened for this attempt, by opening order
+            streams = []
+
+            def open_stream():
+                streams.append(Cancellation())
+                run_in_thread(self._produce, open_chunks, streams[-1], items, len(streams) - 1)
+
+            start = time.monotonic()
+            open_stream()
+            hedge_at = None
+            if hedge and self.hedging:
+                delay = self.hedge_delay(first_chunk_profile)
+                hedge_at = start + delay if delay is not None else None
+            winner = None
+            failed = 0
+            try:
+                while True:
+                    wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+                    try:
+                        source, kind, value = items.get(timeout=max(0.0, wait_until - time.monotonic()))
+                    except queue.Empty:
+                        if time.monotonic() >= deadline:
+                            raise DeadlineExceeded(f"No reply within {self.deadline_for(profile):g}s") from None
+                        hedge_at = None
+                        self._count("hedges")
+                        open_stream()
+                        continue
+                    if winner is not None and source != winner:
+                        continue
+                    if kind == "error":
+                        failed += 1
+                        # Wait for a hedge still running; no new hedge once one has failed
+                        if winner is None and failed < len(streams):
+                            hedge_at = None
+                            continue
+                        raise value
+                    if winner is None:
+                        winner = source
+                        hedge_at = None
+                        self._observe(first_chunk_profile, time.monotonic() - start)
+                        if source:
+                            self._count("hedge_wins")
+                        for other, cancelled in enumerate(streams):
+                            if other != source:
+                                cancelled.set()
+                        self.breaker.record_success()
+                    if kind == "done":
+                        break
+                    yield value
+            except DeadlineExceeded:
+                self._count("timeouts")
+                if winner is None:
+                    self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if winner is not None or not is_transient(e):
+                    if winner is None:
+                        self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                error = e
+                continue
+            finally:
+                for cancelled in streams:
+                    cancelled.set()
+            self.breaker.record_success()
+            return
+        self._count("failures")
+        raise error
+
+    # Function to move chunks from open_chunks(cancelled) onto items, tagged with source,
+    # until the stream ends, fails, or the reader gives up
+    def _produce(self, open_chunks, cancelled, items, source=0):
+        chunks = open_chunks(cancelled)
+        try:
+            for chunk in chunks:
+                if cancelled.is_set():
+                    return
+                items.put((source, "chunk", chunk))
+            items.put((source, "done", None))
+        except Exception as e:
+            items.put((source, "error", e))
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    # Function to report call outcomes and the circuit breaker state
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.stats)
+        snapshot["breaker_state"] = self.breaker.state
+        snapshot["breaker_opened"] = self.breaker.stats["opened"]
+        snapshot["breaker_rejected"] = self.breaker.stats["rejected"]
+        for profile in list(self._latencies):
+            delay = self.hedge_delay(profile)
+            if delay is not None:
+                snapshot[f"{profile}_hedge_delay"] = delay
+        return snapshot
+
+_caller = None
+_caller_lock = threading.Lock()
+
+# Function to get the process-wide resilient caller
+def get_resilient_caller():
+    global _caller
+    with _caller_lock:
+        if _caller is None:
+            _caller = ResilientCaller()
+            metrics = get_metrics()
+            metrics.add_gauge("buddy_circuit_breaker_state", "Model circuit breaker: 0 closed, 1 half-open, 2 open.", lambda: BREAKER_STATES[get_resilient_caller().breaker.state])
+            metrics.add_gauge("buddy_model_retries", "Model call attempts retried after a transient error.", lambda: get_resilient_caller().stats["retries"])
+            metrics.add_gauge("buddy_model_timeouts", "Model calls that ran past their deadline.", lambda: get_resilient_caller().stats["timeouts"])
+            metrics.add_gauge("buddy_model_hedges", "Hedged second attempts sent for slow model calls.", lambda: get_resilient_caller().stats["hedges"])
+        return _caller
+
+# Function to replace the process-wide resilient caller, returning the previous one
+def set_resilient_caller(caller):
+    global _caller
+    with _caller_lock:
+        previous = _caller
+        _caller = caller
+        return previous
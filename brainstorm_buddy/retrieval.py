@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from .config import CACHE_DIR, OFFLINE
+from .extraction import chunk_text, estimate_tokens
+
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+    SentenceTransformer = None
+
+# Local CPU embedding model and retrieval settings
+EMBEDDING_MODEL = os.getenv("BUDDY_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("BUDDY_EMBEDDING_BATCH_SIZE", "64"))
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("BUDDY_RETRIEVAL_CHUNK_TOKENS", "200"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("BUDDY_RETRIEVAL_CHUNK_OVERLAP", "30"))
+RETRIEVAL_TOP_K = int(os.getenv("BUDDY_RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("BUDDY_RETRIEVAL_TOKEN_BUDGET", "600"))
+# Opened indexes kept per process; the least recently searched are closed first
+RETRIEVAL_INDEX_CACHE_ENTRIES = int(os.getenv("BUDDY_RETRIEVAL_INDEX_CACHE_ENTRIES", "32"))
+# Seconds a failed embedding model load is remembered before loading is tried again,
+# so callers fall back at once instead of each waiting out the model hub retries
+EMBEDDER_RETRY_SECONDS = float(os.getenv("BUDDY_EMBEDDER_RETRY_SECONDS", "600"))
+
+# Function to check whether the optional retrieval dependencies are installed
+def retrieval_available():
+    return faiss is not None and SentenceTransformer is not None
+
+# Function to load the embedding model, preferring the locally cached copy
+def load_embedding_model(name=EMBEDDING_MODEL):
+    try:
+        return SentenceTransformer(name, device="cpu", local_files_only=True)
+    except Exception:
+        if OFFLINE:
+            raise
+        return SentenceTransformer(name, device="cpu")
+
+# Function to derive the index key from the document hash and the settings that shape the index
+def index_key(document_hash):
+    config = json.dumps({
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_tokens": RETRIEVAL_CHUNK_TOKENS,
+        "chunk_overlap": RETRIEVAL_CHUNK_OVERLAP,
+    }, sort_keys=True)
+    return hashlib.sha256((document_hash + config).encode("utf-8")).hexdigest()
+
+# Per-document FAISS indexes over cleaned-text chunks, saved under directory and
+# memory-mapped when reopened so a known document is never embedded twice. At most
+# cache_entries opened indexes are kept, least recently used first out.
+class DocumentIndexStore:
+    def __init__(self, directory, embedding_model=EMBEDDING_MODEL, cache_entries=RETRIEVAL_INDEX_CACHE_ENTRIES):
+        self.directory = directory
+        self.embedding_model = embedding_model
+        self.cache_entries = cache_entries
+        self.stats = {"built": 0, "loaded": 0, "chunks_embedded": 0, "embedding_time": 0.0}
+        self._lock = threading.Lock()
+        self._embedder = None
+        # (exception, monotonic time) of the last failed embedding model load
+        self._embedder_error = None
+        # index key -> (index, chunks), in least recently used order
+        self._indexes = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def embedder(self):
+        with self._lock:
+            if self._embedder is None:
+                if self._embedder_error is not None and time.monotonic() - self._embedder_error[1] < EMBEDDER_RETRY_SECONDS:
+                    raise self._embedder_error[0]
+                try:
+                    self._embedder = load_embedding_model(self.embedding_model)
+                except Exception as e:
+                    self._embedder_error = (e, time.monotonic())
+                    raise
+                self._embedder_error = None
+            return self._embedder
+
+    def embed(self, texts):
+        embeddings = self.embedder().encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype="float32")
+
+    def _paths(self, key):
+        folder = os.path.join(self.directory, key)
+        return folder, os.path.join(folder, "index.faiss"), os.path.join(folder, "chunks.json")
+
+    def has(self, document_hash):
+        key = index_key(document_hash)
+        return key in self._indexes or os.path.exists(self._paths(key)[2])
+
+    def build(self, document_hash, cleaned_text):
+        key = index_key(document_hash)
+        chunks = chunk_text(cleaned_text, RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_CHUNK_OVERLAP)
+        start = time.perf_counter()
+        embeddings = self.embed(chunks)
+        index = faiss.IndexFlatIP(embeddings.shape[1])
+        index.add(embeddings)
+        folder, index_path, chunks_path = self._paths(key)
+        os.makedirs(folder, exist_ok=True)
+        faiss.write_index(index, index_path)
+        # chunks.json is written last and marks the index as complete
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(chunks, f)
+        os.replace(chunks_path + ".tmp", chunks_path)
+        with self._lock:
+            # The in-memory copy is not cached; later searches map the saved file
+            self.stats["built"] += 1
+            self.stats["chunks_embedded"] += len(chunks)
+            self.stats["embedding_time"] += time.perf_counter() - start
+        return index, chunks
+
+    def load(self, document_hash):
+        key = index_key(document_hash)
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+        _, index_path, chunks_path = self._paths(key)
+        # IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC also maps the
+        # vectors of a flat index, so they stay on disk until searched
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+        with open(chunks_path, encoding="utf-8") as f:
+            chunks = json.load(f)
+        with self._lock:
+            self._indexes[key] = (index, chunks)
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > max(1, self.cache_entries):
+                self._indexes.popitem(last=False)
+            self.stats["loaded"] += 1
+        return index, chunks
+
+    # Build the index for a document unless one is already saved; load_text is only
+    # called when the document actually has to be embedded
+    def ensure(self, document_hash, load_text):
+        if self.has(document_hash):
+            return self.load(document_hash)
+        return self.build(document_hash, load_text())
+
+    def search(self, document_hash, query, top_k=RETRIEVAL_TOP_K, token_budget=RETRIEVAL_TOKEN_BUDGET):
+        index, chunks = self.load(document_hash)
+        scores, ids = index.search(self.embed([query]), min(top_k, len(chunks)))
+        selected = []
+        used = 0
+        for chunk_id in ids[0]:
+            if chunk_id < 0:
+                continue
+            cost = estimate_tokens(chunks[chunk_id])
+            if used + cost > token_budget:
+                continue
+            selected.append((chunk_id, chunks[chunk_id]))
+            used += cost
+        # Keep document order so excerpts read naturally
+        return [chunk for _, chunk in sorted(selected)]
+
+    # Function to search several documents at once: the question is embedded once and
+    # the best-scoring chunks across all of them share one token budget
+    def search_many(self, document_hashes, query, top_k=RETRIEVAL_TOP_K, token_budget=RETRIEVAL_TOKEN_BUDGET):
+        query_embedding = self.embed([query])
+        candidates = []
+        for position, document_hash in enumerate(document_hashes):
+            index, chunks = self.load(document_hash)
+            scores, ids = index.search(query_embedding, min(top_k, len(chunks)))
+            candidates += [(score, position, chunk_id, chunks[chunk_id]) for score, chunk_id in zip(scores[0], ids[0]) if chunk_id >= 0]
+        selected = []
+        used = 0
+        for score, position, chunk_id, chunk in sorted(candidates, key=lambda candidate: -candidate[0])[:top_k]:
+            cost = estimate_tokens(chunk)
+            if used + cost > token_budget:
+                continue
+            selected.append((position, chunk_id, chunk))
+            used += cost
+        return [chunk for _, _, chunk in sorted(selected)]
+
+_index_store = None
+_index_store_lock = threading.Lock()
+
+# Function to get the process-wide index store, or None when the retrieval dependencies are missing
+def get_index_store():
+    global _index_store
+    if not retrieval_available():
+        return None
+    with _index_store_lock:
+        if _index_store is None:
+            _index_store = DocumentIndexStore(os.path.join(CACHE_DIR, "indexes"))
+        return _index_store
+
+# Function to fetch the chunks most relevant to the question from a processed document,
+# or from each document of a workspace when given a list of hashes
+def retrieve_excerpts(document_hash, user_question):
+    index_store = get_index_store()
+    if not document_hash or index_store is None:
+        return []
+    try:
+        if isinstance(document_hash, str):
+            return index_store.search(document_hash, user_question)
+        return index_store.search_many(document_hash, user_question)
+    except Exception:
+        return []
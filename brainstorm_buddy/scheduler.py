@@ -0,0 +1,186 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from .config import MODEL_MAX_CONCURRENCY, MODEL_RATE_BURST, MODEL_RATE_LIMIT
+from .metrics import get_metrics
+
+# Request priorities; lower values are admitted first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+# Parameter profiles that run in the background rather than while a user waits on a chat reply
+BULK_PROFILES = {"Summary", "ChunkSummary", "HistorySummary"}
+RECENT_WAITS = 500
+
+# Function to get the scheduling priority of a parameter profile
+def priority_for(profile):
+    return BULK if profile in BULK_PROFILES else INTERACTIVE
+
+# Process-wide gate in front of the model service. Requests are admitted in priority
+# order (then arrival order) when a concurrency slot is free and the token bucket
+# has a token, so bursts from many sessions are smoothed to the configured rate.
+# Identical requests already in flight are coalesced onto one call. A call abandoned
+# by its caller (past its deadline, or a losing hedge) gives its slot back at once and
+# is counted as abandoned until the service finally answers it.
+class RequestScheduler:
+    def __init__(self, rate=MODEL_RATE_LIMIT, burst=MODEL_RATE_BURST, max_concurrency=MODEL_MAX_CONCURRENCY):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.stats = {"admitted": 0, "coalesced": 0, "abandoned": 0, "max_queue_depth": 0, "wait_time": 0.0, "max_wait": 0.0}
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._abandoned = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._waits = {priority: deque(maxlen=RECENT_WAITS) for priority in PRIORITY_NAMES}
+        self._in_flight = {}
+
+    # Function to take a rate token, returning 0 or the seconds until one is available
+    def _take_token(self):
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    # Function to wait for a slot, returning the seconds spent queued
+    def acquire(self, priority=INTERACTIVE):
+        start = time.monotonic()
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+            while True:
+                if self._queue[0] == ticket and self._active < self.max_concurrency:
+                    delay = self._take_token()
+                    if delay == 0:
+                        break
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+            heapq.heappop(self._queue)
+            self._active += 1
+            waited = time.monotonic() - start
+            self.stats["admitted"] += 1
+            self.stats["wait_time"] += waited
+            self.stats["max_wait"] = max(self.stats["max_wait"], waited)
+            self._waits[priority].append(waited)
+            # The next request in line may be admissible now
+            self._condition.notify_all()
+        return waited
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    # Context manager holding a slot for the duration of a model call. When cancelled
+    # (see resilience.Cancellation) is set while the call is still running, the slot is
+    # released right away rather than when the abandoned call returns.
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, label=None, cancelled=None):
+        waited = self.acquire(priority)
+        get_metrics().record("queue_wait", waited, mode=label)
+        lock = threading.Lock()
+        held = [True]
+
+        def abandon():
+            with lock:
+                if not held[0]:
+                    return
+                held[0] = False
+            with self._condition:
+                self.stats["abandoned"] += 1
+                self._abandoned += 1
+            self.release()
+
+        # A call cancelled while queued is skipped by its caller and releases normally
+        if cancelled is not None and not cancelled.is_set():
+            cancelled.on_cancel(abandon)
+        try:
+            yield waited
+        finally:
+            with lock:
+                was_held, held[0] = held[0], False
+            if was_held:
+                self.release()
+            else:
+                with self._condition:
+                    self._abandoned -= 1
+
+    def _join(self, key):
+        with self._condition:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _leave(self, key):
+        with self._condition:
+            self._in_flight.pop(key, None)
+
+    # Function to run function once for all concurrent callers with the same key
+    def coalesce(self, key, function):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    # Function to report queue depth, requests in flight and wait times by priority
+    def snapshot(self):
+        with self._condition:
+            snapshot = dict(self.stats)
+            snapshot["queue_depth"] = len(self._queue)
+            snapshot["active"] = self._active
+            snapshot["abandoned_active"] = self._abandoned
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                snapshot[f"{name}_queued"] = sum(1 for queued, _ in self._queue if queued == priority)
+                snapshot[f"{name}_wait_p50"] = waits[int(0.50 * (len(waits) - 1))] if waits else 0.0
+                snapshot[f"{name}_wait_p95"] = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+        return snapshot
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# Function to get the process-wide request scheduler
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+            metrics = get_metrics()
+            metrics.add_gauge("buddy_scheduler_queue_depth", "Model requests waiting for a slot.", lambda: get_scheduler().snapshot()["queue_depth"])
+            metrics.add_gauge("buddy_scheduler_active_requests", "Model requests in flight.", lambda: get_scheduler().snapshot()["active"])
+            metrics.add_gauge("buddy_scheduler_abandoned_requests", "Abandoned model requests the service has not answered yet; they hold no slot.", lambda: get_scheduler().snapshot()["abandoned_active"])
+            metrics.add_gauge("buddy_scheduler_coalesced_requests", "Requests served by an identical in-flight request.", lambda: get_scheduler().snapshot()["coalesced"])
+        return _scheduler
+
+# Function to replace the process-wide request scheduler, returning the previous one
+def set_scheduler(scheduler):
+    global _scheduler
+    with _scheduler_lock:
+        previous = _scheduler
+        _scheduler = scheduler
+        return previous
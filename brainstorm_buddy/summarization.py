@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import SUMMARY_CHUNK_OVERLAP, SUMMARY_CHUNK_TOKENS, SUMMARY_CONCURRENCY
+from .extraction import chunk_text, estimate_tokens
+from .generation import generate
+from .prompts import build_chunk_summary_prompt, build_summary_prompt
+from .tokenizer import get_token_counter
+
+# Most map rounds before the partial summaries are cut to fit the final prompt
+MAX_SUMMARY_ROUNDS = 4
+
+# Function to summarize chunks concurrently, returning summaries in chunk order
+def summarize_chunks(chunks, concurrency, timings):
+    def summarize_chunk(item):
+        index, chunk = item
+        chunk_timings = {}
+        summary = generate("ChunkSummary", build_chunk_summary_prompt(chunk, index + 1, len(chunks)), chunk_timings)
+        return summary, chunk_timings["total_time"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(summarize_chunk, enumerate(chunks)))
+    timings["map"] = timings.get("map", 0.0) + time.perf_counter() - start
+    timings["slowest_chunk"] = max([timings.get("slowest_chunk", 0.0)] + [elapsed for _, elapsed in results])
+    timings["chunks"] = timings.get("chunks", 0) + len(chunks)
+    return [summary for summary, _ in results]
+
+# Function to build the final (reduce) summary prompt. Text that does not fit in one
+# chunk is summarized chunk by chunk in parallel, repeating until the partial
+# summaries fit, so the final pass always sees a bounded prompt. When a round does
+# not shrink the text (chunks too small for the summaries, or a model ignoring the
+# word limit) or MAX_SUMMARY_ROUNDS have run, the shortest text so far is truncated.
+def prepare_summary_prompt(cleaned_text, timings, concurrency=SUMMARY_CONCURRENCY):
+    text = cleaned_text
+    tokens = estimate_tokens(text)
+    rounds = 0
+    while tokens > SUMMARY_CHUNK_TOKENS:
+        if rounds == MAX_SUMMARY_ROUNDS:
+            text = get_token_counter().truncate(text, SUMMARY_CHUNK_TOKENS)
+            timings["truncated"] = True
+            break
+        start = time.perf_counter()
+        chunks = chunk_text(text, SUMMARY_CHUNK_TOKENS, SUMMARY_CHUNK_OVERLAP)
+        timings["chunking"] = timings.get("chunking", 0.0) + time.perf_counter() - start
+        summaries = "\n".join(summarize_chunks(chunks, concurrency, timings))
+        rounds += 1
+        timings["rounds"] = rounds
+        summary_tokens = estimate_tokens(summaries)
+        if summary_tokens >= tokens:
+            text = get_token_counter().truncate(text, SUMMARY_CHUNK_TOKENS)
+            timings["truncated"] = True
+            break
+        text, tokens = summaries, summary_tokens
+    return build_summary_prompt(text)
+
+# Function to summarize document using Granite
+def summarize_document(cleaned_text, timings=None, concurrency=SUMMARY_CONCURRENCY):
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    try:
+        prompt = prepare_summary_prompt(cleaned_text, timings, concurrency)
+        reduce_timings = {}
+        summary = generate("Summary", prompt, reduce_timings)
+        timings["reduce"] = reduce_timings["total_time"]
+        return summary
+    except Exception as e:
+        timings["error"] = type(e).__name__
+        return f"Error generating summary: {str(e)}"
+    finally:
+        timings["total_time"] = time.perf_counter() - start
@@ -0,0 +1,67 @@
+import os
+import threading
+from .config import CACHE_DIR, OFFLINE, TOKENIZER_NAME
+from .extraction import CHARS_PER_TOKEN, estimate_tokens
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+# Function to load the Granite tokenizer, keeping a local copy under directory so
+# later runs (and offline runs) do not need the model hub
+def load_tokenizer(name=TOKENIZER_NAME, directory=os.path.join(CACHE_DIR, "tokenizers")):
+    path = os.path.join(directory, name.replace("/", "--") + ".json")
+    if os.path.exists(path):
+        return Tokenizer.from_file(path)
+    if OFFLINE:
+        raise FileNotFoundError(f"Tokenizer {name} is not cached at {path}")
+    tokenizer = Tokenizer.from_pretrained(name)
+    os.makedirs(directory, exist_ok=True)
+    tokenizer.save(path)
+    return tokenizer
+
+# Counts and truncates text in model tokens. Without a tokenizer it falls back to
+# the characters-per-token estimate used elsewhere for budgeting.
+class TokenCounter:
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.name = TOKENIZER_NAME if tokenizer is not None else "estimate"
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return estimate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    # Function to cut text down to at most max_tokens, on a token boundary
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            if len(text) <= max_tokens * CHARS_PER_TOKEN:
+                return text
+            return text[:max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= max_tokens:
+            return text
+        return text[:encoding.offsets[max_tokens - 1][1]]
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+# Function to get the process-wide token counter, falling back to estimates when
+# the tokenizer cannot be loaded
+def get_token_counter():
+    global _token_counter
+    with _token_counter_lock:
+        if _token_counter is None:
+            tokenizer = None
+            if Tokenizer is not None:
+                try:
+                    tokenizer = load_tokenizer()
+                except Exception:
+                    tokenizer = None
+            _token_counter = TokenCounter(tokenizer)
+        return _token_counter
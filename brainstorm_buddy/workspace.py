@@ -0,0 +1,98 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .caching import document_hash
+from .config import INGEST_WORKERS, WORKSPACE_SUMMARY_TOKENS
+from .documents import process_document
+from .tokenizer import get_token_counter
+
+# Share of a document's processing done when each stage starts, for progress bars
+STAGE_PROGRESS = {"queued": 0.0, "reading": 0.05, "extracting": 0.1, "summarizing": 0.35, "indexing": 0.85, "ready": 1.0, "failed": 1.0}
+
+# The documents of one brainstorming session. Added files are ingested (extract,
+# clean, summarize, index) on the shared ingest pool while the UI stays usable;
+# each document is keyed by its content hash, so adding a file only processes
+# that file. Summary calls run at bulk priority, behind chat turns.
+class DocumentWorkspace:
+    def __init__(self, pool=None):
+        self.pool = pool
+        self._lock = threading.Lock()
+        # content hash -> document entry, in the order added
+        self._documents = {}
+        self._combined = (None, "")
+
+    # Function to queue a document for ingestion, returning its content hash.
+    # A document already in the workspace is only queued again if it failed.
+    def add(self, name, document_bytes):
+        content_hash = document_hash(document_bytes)
+        with self._lock:
+            entry = self._documents.get(content_hash)
+            if entry is not None and entry["status"] != "failed":
+                return content_hash
+            entry = self._documents[content_hash] = {
+                "name": name, "hash": content_hash, "status": "queued", "progress": 0.0,
+                "summary": "", "indexed": False, "error": None, "stats": {},
+            }
+        (self.pool or get_ingest_pool()).submit(self._ingest, entry, document_bytes)
+        return content_hash
+
+    def remove(self, content_hash):
+        with self._lock:
+            self._documents.pop(content_hash, None)
+
+    def _update(self, entry, **fields):
+        with self._lock:
+            entry.update(fields)
+
+    def _ingest(self, entry, document_bytes):
+        stats = {}
+
+        def progress(stage):
+            self._update(entry, status=stage, progress=STAGE_PROGRESS[stage])
+
+        try:
+            document = process_document(io.BytesIO(document_bytes), entry["name"], stats, progress=progress)
+        except Exception as e:
+            self._update(entry, status="failed", progress=1.0, error=str(e), stats=stats)
+            return
+        self._update(entry, status="ready", progress=1.0, summary=document["summary"], indexed=document["indexed"], stats=stats)
+
+    # Function to list the documents, in the order added, as copies safe to read while ingestion runs
+    def documents(self):
+        with self._lock:
+            return [dict(entry) for entry in self._documents.values()]
+
+    # Function to count the documents still being ingested
+    def pending(self):
+        with self._lock:
+            return sum(1 for entry in self._documents.values() if entry["status"] not in ("ready", "failed"))
+
+    # Function to combine the summaries of the ingested documents for the prompts. Each
+    # document gets an equal share of max_tokens so a long one cannot crowd out the rest.
+    def combined_summary(self, max_tokens=WORKSPACE_SUMMARY_TOKENS, counter=None):
+        ready = [entry for entry in self.documents() if entry["status"] == "ready"]
+        if len(ready) <= 1:
+            return ready[0]["summary"] if ready else ""
+        key = (tuple(entry["hash"] for entry in ready), max_tokens)
+        if self._combined[0] == key:
+            return self._combined[1]
+        counter = counter or get_token_counter()
+        share = max_tokens // len(ready)
+        combined = "\n\n".join(f"{entry['name']}: {counter.truncate(entry['summary'], share)}" for entry in ready)
+        self._combined = (key, combined)
+        return combined
+
+    # Function to list the hashes of the indexed documents, for retrieval across the workspace
+    def document_hashes(self):
+        return [entry["hash"] for entry in self.documents() if entry["status"] == "ready" and entry["indexed"]]
+
+_ingest_pool = None
+_ingest_pool_lock = threading.Lock()
+
+# Function to get the process-wide ingest pool shared by all workspaces
+def get_ingest_pool():
+    global _ingest_pool
+    with _ingest_pool_lock:
+        if _ingest_pool is None:
+            _ingest_pool = ThreadPoolExecutor(max_workers=max(1, INGEST_WORKERS), thread_name_prefix="ingest")
+        return _ingest_pool
@@ -1,183 +1,143 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-import os
-import re
-from ibm_watsonx_ai import APIClient, Credentials
-from ibm_watsonx_ai.foundation_models import ModelInference
-from dotenv import load_dotenv
+import time
+import uuid
+from brainstorm_buddy.assembly import ConversationMemory, conversation_context
+from brainstorm_buddy.caching import DEFAULT_CACHED_MODES, get_response_cache, get_summary_cache, lookup_response, store_response
+from brainstorm_buddy.clients import get_client_registry
+from brainstorm_buddy.config import HISTORY_WINDOW_MESSAGES, IDEA_COUNT_MAX, THINKING_MODES
+from brainstorm_buddy.generation import compact_conversation, compare_thinking_modes, get_ai_response, stream_ai_response
+from brainstorm_buddy.history import open_session_history
+from brainstorm_buddy.ideas import format_ideas, generate_ideas
+from brainstorm_buddy.metrics import get_metrics
+from brainstorm_buddy.resilience import get_resilient_caller
+from brainstorm_buddy.retrieval import get_index_store
+from brainstorm_buddy.scheduler import get_scheduler
+from brainstorm_buddy.workspace import DocumentWorkspace
 
-# Load environment variables from .env file
-load_dotenv()
-WATSONX_URL = os.getenv("WATSONX_URL")
-WATSONX_API_KEY = os.getenv("WATSONX_API_KEY")
-WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID")
+# Button state that sends one question to every thinking mode at once
+COMPARE_MODES = "Compare"
+# Seconds between refreshes of the workspace panel while documents are ingesting
+WORKSPACE_REFRESH_SECONDS = 1.0
 
-# Initialize IBM Granite model credentials
-credentials = Credentials(url=WATSONX_URL, api_key=WATSONX_API_KEY)
-model_id = "ibm/granite-3-8b-instruct"
+# Function to render this session's conversation as it goes into the prompt, for cache scopes
+def session_conversation(user_question):
+    return conversation_context(user_question, st.session_state.get("chat_history"), st.session_state.get("conversation_memory"))
 
-# Function to clean extracted PDF text
-def clean_pdf_text(text):
-    text = re.sub(r'(\d+\.\n)', r'\1__PRESERVE_NEWLINE__', text)
-    text = re.sub(r'(●\n)', r'\1__PRESERVE_NEWLINE__', text)
-    text = re.sub(r'(○\n)', r'\1__PRESERVE_NEWLINE__', text)
-    text = re.sub(r'\n+', ' ', text)
-    text = text.replace('__PRESERVE_NEWLINE__', '\n')
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# Function to look up a cached answer for this session's opted-in modes
+def lookup_cached_response(user_question, thinking_mode):
+    return lookup_response(user_question, thinking_mode, st.session_state.get("document_summary", ""), st.session_state.get("cached_modes", DEFAULT_CACHED_MODES), session_conversation(user_question))
 
-# Function to summarize document using Granite
-def summarize_document(cleaned_text):
-    parameters = {
-        "decoding_method": "sample",
-        "max_new_tokens": 550,  # Approx. 450 words
-        "min_new_tokens": 0,
-        "temperature": 0.7,
-        "top_k": 50,
-        "top_p": 0.9,
-        "repetition_penalty": 1
-    }
-    prompt = (
-        "You are an AI Brainstorming Buddy powered by IBM Granite. Analyze the following business meeting notes related to soap marketing. "
-        "Summarize the key information in a concise, structured format using bullet points, optimized for further brainstorming. Include:\n\n"
-        "- What the Meeting Highlights About: Key themes, focus areas, or insights from the discussion (e.g., branding trends, target audience preferences, or promotional opportunities).\n"
-        "- Key Discussion Points: Main issues or topics discussed, in brief.\n"
-        "- Decisions Made: Any conclusions or agreements reached, in brief.\n"
-        "- Action Items: Specific tasks assigned or next steps, in brief.\n"
-        "- Important Insights: Key takeaways relevant to soap marketing, in brief.\n\n"
-        "Limit the summary to a maximum of 200 words. Use concise, actionable points that are clear and suitable for brainstorming marketing strategies. "
-        "Text to summarize: {cleaned_text}"
-        "start by Summary:"
-    ).format(**{"cleaned_text": cleaned_text})
+# Function to store a generated answer for this session's opted-in modes
+def store_cached_response(user_question, thinking_mode, response, generation_time):
+    store_response(user_question, thinking_mode, response, generation_time, st.session_state.get("document_summary", ""), st.session_state.get("cached_modes", DEFAULT_CACHED_MODES), session_conversation(user_question))
+
+# Function to fold older messages into this session's rolling conversation summary.
+# A failed fold leaves the memory unchanged and is retried after the next turn.
+def compact_session_history():
     try:
-        model = ModelInference(
-            model_id=model_id,
-            params=parameters,
-            credentials=credentials,
-            project_id=WATSONX_PROJECT_ID
-        )
-        summary = model.generate_text(prompt=prompt, guardrails=True)
-        return summary
-    except Exception as e:
-        return f"Error generating summary: {str(e)}"
+        with st.spinner("Updating conversation memory..."):
+            compact_conversation(st.session_state.conversation_memory, st.session_state.chat_history)
+    except Exception:
+        pass
 
-# Function to get AI response from Granite model
-def get_ai_response(user_question, thinking_mode=None, chat_history=None):
-    # Initialize model with mode-specific parameters
-    if thinking_mode:
-        # Get document summary from session state at the beginning
-        document_summary = st.session_state.get("document_summary", "")
-        
-        if thinking_mode == "Creative":
-            parameters = {
-                "decoding_method": "sample",
-                "max_new_tokens": 300,
-                "min_new_tokens": 0,
-                "temperature": 1.2,
-                "top_k": 75,
-                "top_p": 1.0,
-                "repetition_penalty": 1
-            }
-            prompt = f"""
-                You are an AI Brainstorming Buddy powered by IBM Granite.
+# Function to show another page of earlier messages
+def load_earlier_messages():
+    st.session_state.history_window += HISTORY_WINDOW_MESSAGES
 
-                Below is a concise summary of the user’s document:
-                {document_summary if document_summary else "No summary provided."}
+# Function to send a picked idea as the next message, so the conversation builds on it
+def build_on_idea(idea):
+    st.session_state.pending_input = f"Let's develop this idea further: {idea}"
 
-                Task:
-                Based on the above summary, suggest just one highly creative and original idea in response to the following question:
+# Function to label a chat turn's response cache outcome for the render metrics
+def cache_outcome(thinking_mode, cached):
+    if cached is not None:
+        return "hit"
+    return "miss" if (thinking_mode or "Conversational") in st.session_state.get("cached_modes", DEFAULT_CACHED_MODES) else "off"
 
-                “{user_question}”
+# Function to render extraction timings and memory use
+def format_extraction_stats(stats):
+    parts = []
+    if stats.get("pages"):
+        page_times = stats["page_times"]
+        parts.append(f"{stats['pages']} pages on {stats['workers']} worker(s)")
+        parts.append(f"avg page {sum(page_times) / len(page_times):.3f}s, slowest {max(page_times):.3f}s")
+    parts.append(f"extracted in {stats['extraction_time']:.2f}s")
+    if "cleaning_time" in stats:
+        parts.append(f"cleaned in {stats['cleaning_time']:.2f}s")
+    if stats.get("peak_rss"):
+        parts.append(f"peak RSS {format_bytes(stats['peak_rss'])}")
+    return " · ".join(parts)
 
-                Instructions:
-                - Present your idea in a conversational, friendly, and professional tone.
-                - Naturally explain your thinking in 4–5 sentences, as if you’re chatting with the user and inviting their thoughts.
-                - Highlight how your idea addresses the user’s needs.
-                - Keep the whole response under 70 words.
+# Function to show each workspace document's ingestion progress, or its summary once
+# ready. When the last pending document finishes, the whole app reruns so chat
+# picks up the new context and the periodic refresh stops.
+def render_workspace(refreshing):
+    workspace = st.session_state.workspace
+    for document in workspace.documents():
+        if document["status"] == "ready":
+            with st.expander(f"✅ {document['name']}"):
+                st.write(document["summary"])
+                stats = document["stats"]
+                if stats.get("summary_cached"):
+                    st.caption("Summary loaded from cache")
+                elif "extraction_time" in stats:
+                    st.caption(format_extraction_stats(stats))
+                if not document["indexed"]:
+                    st.caption(f"Document index unavailable: {stats.get('index_error', 'retrieval is not installed')}")
+        elif document["status"] == "failed":
+            st.error(f"{document['name']}: {document['error']}")
+        else:
+            st.progress(document["progress"], text=f"{document['name']}: {document['status']}...")
+    if refreshing and not workspace.pending():
+        st.rerun()
 
-                Instead of a structured format, speak as if you’re brainstorming with the user and open to further discussion.
-            """
-        elif thinking_mode == "Diverse":
-            parameters = {
-                "decoding_method": "sample",
-                "max_new_tokens": 300,
-                "min_new_tokens": 0,
-                "temperature": 0.9,
-                "top_k": 60,
-                "top_p": 0.9,
-                "repetition_penalty": 1
-            }
-            prompt = (
-                "You are an AI Brainstorming Buddy powered by IBM Granite.\n"
-                "Below is a concise summary of the user’s document:\n"
-                f"{document_summary if document_summary else 'No summary provided.'}\n\n"
-                "Task:\n"
-                "Drawing from the summary, suggest just one practical idea for the user’s question that thoughtfully considers one of the diverse and multiple perspectives (e.g., different stakeholders, scenarios, or approaches, etc):\n"
-                f"“{user_question}”\n\n"
-                "Instructions:\n"
-                "- Share your idea in a friendly, conversational tone, as if you’re discussing options with the user.\n"
-                "- Explain within 10 sentences how you weighed different viewpoints and why this idea might work well from several angles.\n"
-                "- Invite the user to share their own perspective or ask questions.\n"
-                "- Keep the response under 100 words.\n\n"
-                "Instead of a structured format, speak as if you’re brainstorming with the user and open to further discussion."
-            )
-        elif thinking_mode == "Lateral":
-            parameters = {
-                "decoding_method": "sample",
-                "max_new_tokens": 300,
-                "min_new_tokens": 0,
-                "temperature": 1.0,
-                "top_k": 30,
-                "top_p": 1.0,
-                "repetition_penalty": 1
-            }
-            prompt = (
-                "You are an AI Brainstorming Buddy powered by IBM Granite.\n"
-                "Below is a concise summary of the user’s document:\n"
-                f"{document_summary if document_summary else 'No summary provided.'}\n\n"
-                "Task:\n"
-                "Based on the above summary, suggest one unique idea for the user’s question using the SCAMPER technique (Substitute, Combine, Adapt, Modify, Put to another use, Eliminate, Reverse). Choose the most relevant SCAMPER action and apply it creatively:\n"
-                f"“{user_question}”\n\n"
-                "Instructions:\n"
-                "- Weave the SCAMPER action you’re using naturally into your conversational explanation, without labeling it explicitly.\n"
-                "- Present your idea in a friendly, professional tone, as if you’re brainstorming together.\n"
-                "- In 8–10 sentences, explain how you came up with the idea and why it addresses the user’s needs, keeping the tone open and engaging.\n"
-                "- Keep the response under 100 words.\n\n"
-                "Avoid any headings, bullet points, or structured formatting-just a clear, natural conversation that invites the user to discuss or ask questions."
+# Function to format a byte count for display
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
 
-            )
-    else:
-        # Mode B: Conversational
-        parameters = {
-            "decoding_method": "sample",
-            "max_new_tokens": 150,
-            "min_new_tokens": 0,
-            "temperature": 0.7,
-            "top_k": 50,
-            "top_p": 0.9,
-            "repetition_penalty": 1
-        }
-        previous_messages = ""
-        if chat_history and len(chat_history) >= 2:
-            previous_messages = f"User: {chat_history[-2]['content']}\nAssistant: {chat_history[-1]['content']}"
-        prompt = (
-            "You are a conversational AI Brainstorming Assistant. Clarify or elaborate on the user’s question: {user_question}, "
-            "using the following previous message pair for context: {previous_messages}. "
-            "Provide a clear, concise response within 100–200 words to deepen the discussion."
-        ).format(**{"user_question": user_question, "previous_messages": previous_messages if previous_messages else "No previous messages"})
+# Function to render the tokens used by each prompt section
+def format_prompt_tokens(report):
+    sections = report["sections"]
+    return (
+        f"prompt {report['total']}/{report['budget']} tokens: instructions {sections['instructions']}, "
+        f"question {sections['question']}, context {sections['context']}, recent {sections['recent_turns']}, "
+        f"earlier {sections['history_summary']}"
+    )
 
-    # Initialize and call Granite model
-    try:
-        model = ModelInference(
-            model_id=model_id,
-            params=parameters,
-            credentials=credentials,
-            project_id=WATSONX_PROJECT_ID
+# Function to render a turn's timing breakdown
+def format_timings(timings):
+    if timings.get("cached"):
+        return f"♻️ Cached answer · saved {timings['saved_time']:.2f}s of generation"
+    parts = []
+    if timings.get("queue_wait", 0.0) >= 0.05:
+        parts.append(f"queued {timings['queue_wait']:.2f}s")
+    if timings.get("retries"):
+        parts.append(f"retried {timings['retries']}x")
+    if "time_to_first_token" in timings:
+        parts.append(f"first token {timings['time_to_first_token']:.2f}s")
+    if timings.get("chunks"):
+        parts.append(f"{timings['chunks']} chunks")
+    for stage in ("chunking", "map", "slowest_chunk", "reduce"):
+        if stage in timings:
+            parts.append(f"{stage.replace('_', ' ')} {timings[stage]:.2f}s")
+    if timings.get("ideas"):
+        parts.append(
+            f"{timings['ideas']} ideas from {timings['candidates']} candidates in {timings['calls']} call(s) · "
+            f"{timings['tokens_per_idea']:.0f} tokens/idea · {timings['time_per_idea']:.2f}s/idea"
         )
-        response = model.generate_text(prompt=prompt, guardrails=True)
-        return response
-    except Exception as e:
-        return f"Error generating response: {str(e)}"
+    if "total_time" in timings:
+        parts.append(f"total {timings['total_time']:.2f}s")
+    if "compare_time" in timings:
+        parts.append(f"all modes {timings['compare_time']:.2f}s")
+    if not timings.get("streamed"):
+        parts.append("blocking")
+    if "prompt_tokens" in timings:
+        parts.append(format_prompt_tokens(timings["prompt_tokens"]))
+    return " · ".join(parts)
 
 # Sidebar configuration
 with st.sidebar:
@@ -253,23 +213,56 @@ with st.sidebar:
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="upload-section">Document Upload</div>', unsafe_allow_html=True)
     st.markdown('<div class="upload-text">Upload PDFs, text files, or documents to reference during brainstorming session.</div>', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader("Select Files", type=["pdf", "txt"], accept_multiple_files=False, label_visibility="collapsed")
-    
-    if uploaded_file is not None:
-        st.markdown(f'<div class="upload-text">Uploaded File: {uploaded_file.name}</div>', unsafe_allow_html=True)
-        if st.button("Process Document"):
-            with st.spinner("Processing and summarizing..."):
-                pdf_reader = PdfReader(uploaded_file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                cleaned_text = clean_pdf_text(text)
-                summary = summarize_document(cleaned_text)
-                st.session_state.document_summary = summary
-                st.success("Document processed and summarized!")
-                # Display summary for debugging
-                with st.expander("View Document Summary"):
-                    st.write(summary)
+    uploaded_files = st.file_uploader("Select Files", type=["pdf", "txt"], accept_multiple_files=True, label_visibility="collapsed")
+    if "workspace" not in st.session_state:
+        st.session_state.workspace = DocumentWorkspace()
+        # Uploader file id -> content hash of each file already handed to the workspace
+        st.session_state.workspace_files = {}
+    workspace = st.session_state.workspace
+    # New uploads are queued for background ingestion; files removed from the uploader leave the workspace
+    workspace_files = {}
+    for uploaded_file in uploaded_files or []:
+        content_hash = st.session_state.workspace_files.get(uploaded_file.file_id)
+        if content_hash is None:
+            content_hash = workspace.add(uploaded_file.name, uploaded_file.getvalue())
+        workspace_files[uploaded_file.file_id] = content_hash
+    for content_hash in set(st.session_state.workspace_files.values()) - set(workspace_files.values()):
+        workspace.remove(content_hash)
+    st.session_state.workspace_files = workspace_files
+    # Progress refreshes on its own while documents are ingesting, without rerunning the chat
+    refreshing = workspace.pending() > 0
+    st.fragment(render_workspace, run_every=WORKSPACE_REFRESH_SECONDS if refreshing else None)(refreshing)
+
+    # Summary cache and model client pool counters
+    summary_cache = get_summary_cache()
+    st.caption(f"Summary cache: {summary_cache.hit_rate():.0%} hit rate · {format_bytes(summary_cache.stats['bytes_saved'])} saved")
+    response_cache = get_response_cache()
+    st.multiselect("Reuse cached answers for", THINKING_MODES + ["Conversational"], default=DEFAULT_CACHED_MODES, key="cached_modes")
+    st.caption(f"Response cache: {response_cache.hit_rate():.0%} hit rate · {response_cache.stats['generation_seconds_saved']:.1f}s generation saved")
+    with st.expander("Model Client Stats"):
+        st.write(get_client_registry().stats)
+        st.write(get_scheduler().snapshot())
+        st.write(get_resilient_caller().snapshot())
+        if get_index_store() is not None:
+            st.write(get_index_store().stats)
+    # Per-stage latency, token and error breakdown, when BUDDY_METRICS is on
+    metrics = get_metrics()
+    if metrics.enabled:
+        with st.expander("Diagnostics"):
+            if metrics.server_address:
+                host, port = metrics.server_address[:2]
+                st.caption(f"Prometheus metrics: http://{host}:{port}/metrics")
+            elif metrics.server_error:
+                st.caption(f"Metrics endpoint unavailable: {metrics.server_error}")
+            stage_rows = metrics.stage_summary()
+            if stage_rows:
+                st.dataframe(stage_rows, hide_index=True)
+            else:
+                st.caption("No requests recorded yet.")
+            recent_errors = [event for event in metrics.events if event["error"]]
+            if recent_errors:
+                st.caption("Recent errors")
+                st.dataframe([{"stage": event["stage"], "mode": event["mode"], "error": event["error"]} for event in recent_errors[-5:]], hide_index=True)
 
 # Chat section CSS
 st.markdown("""
@@ -343,7 +336,8 @@ st.markdown("""
     }
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="creative_btn"],
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="diverse_btn"],
-    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"] {
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"],
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="compare_btn"] {
         background: linear-gradient(135deg, rgba(50, 50, 50, 0.7), rgba(30, 30, 30, 0.7)) !important;
         color: #e0e0e0 !important;
         border: none !important;
@@ -362,21 +356,24 @@ st.markdown("""
     }
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="creative_btn"]:hover,
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="diverse_btn"]:hover,
-    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"]:hover {
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"]:hover,
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="compare_btn"]:hover {
         transform: scale(1.05) !important;
         background: linear-gradient(135deg, rgba(70, 70, 70, 0.7), rgba(50, 50, 50, 0.7)) !important;
         box-shadow: 0 2px 5px rgba(0, 0, 0, 0.4), 0 1px 2px rgba(0, 0, 0, 0.3) !important;
     }
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="creative_btn"][data-selected="true"],
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="diverse_btn"][data-selected="true"],
-    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"][data-selected="true"] {
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"][data-selected="true"],
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="compare_btn"][data-selected="true"] {
         background: linear-gradient(135deg, rgba(90, 110, 255, 0.9), rgba(70, 90, 220, 0.9)) !important;
         color: #ffffff !important;
         box-shadow: 0 2px 5px rgba(0, 0, 0, 0.4), 0 1px 2px rgba(0, 0, 0, 0.3) !important;
     }
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="creative_btn"] span,
     div[data-testid="stHorizontalBlock"] button[kind="primary"][key="diverse_btn"] span,
-    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"] span {
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="lateral_btn"] span,
+    div[data-testid="stHorizontalBlock"] button[kind="primary"][key="compare_btn"] span {
         font-size: 8px !important;
     }
     footer {
@@ -386,15 +383,25 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = open_session_history(st.session_state.session_id)
+if "history_window" not in st.session_state:
+    st.session_state.history_window = HISTORY_WINDOW_MESSAGES
 if "thinking_mode" not in st.session_state:
     st.session_state.thinking_mode = None
-if "document_summary" not in st.session_state:
-    st.session_state.document_summary = ""
+if "conversation_memory" not in st.session_state:
+    st.session_state.conversation_memory = ConversationMemory()
+# Chat draws on every document ingested into the workspace so far
+st.session_state.document_summary = st.session_state.workspace.combined_summary()
+st.session_state.document_hash = st.session_state.workspace.document_hashes()
 
-# Display chat messages
-for message in st.session_state.chat_history:
+# Display the latest chat messages; earlier ones are read back from the session store on request
+history_start = max(0, len(st.session_state.chat_history) - st.session_state.history_window)
+if history_start > 0:
+    st.button(f"Load earlier messages ({history_start} more)", key="load_earlier_btn", on_click=load_earlier_messages)
+for position, message in enumerate(st.session_state.chat_history[history_start:], history_start):
     with st.chat_message(message["role"]):
         if message["role"] == "assistant" and "thinking_mode" in message and message["thinking_mode"] is not None:
             thinking_mode_class = message["thinking_mode"].lower()
@@ -402,11 +409,17 @@ for message in st.session_state.chat_history:
         st.markdown(message["content"])
         if message["role"] == "assistant" and "thinking_mode" in message and message["thinking_mode"] is not None:
             st.markdown('</div>', unsafe_allow_html=True)
+        if message.get("timings"):
+            st.caption(format_timings(message["timings"]))
+        # The latest set of ideas can be picked to carry the conversation forward
+        if message.get("ideas") and position == len(st.session_state.chat_history) - 1:
+            for number, idea in enumerate(message["ideas"], 1):
+                st.button(f"Build on idea {number}", key=f"idea_btn_{number}", help=idea, on_click=build_on_idea, args=(idea,))
 
 # Thinking mode buttons
 col_buttons, col_empty = st.columns([1, 1], gap="small")
 with col_buttons:
-    col1, col2, col3 = st.columns([1, 1, 1], gap="small")
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1], gap="small")
     with col1:
         creative_selected = st.session_state.thinking_mode == "Creative"
         if st.button("💡 Creative", key="creative_btn", use_container_width=True, help="Innovative, out-of-the-box ideas"):
@@ -419,8 +432,12 @@ with col_buttons:
         lateral_selected = st.session_state.thinking_mode == "Lateral"
         if st.button("🔍 Lateral", key="lateral_btn", use_container_width=True, help="Unexpected connections and insights"):
             st.session_state.thinking_mode = "Lateral" if st.session_state.thinking_mode != "Lateral" else None
+    with col4:
+        compare_selected = st.session_state.thinking_mode == COMPARE_MODES
+        if st.button("⚖️ Compare", key="compare_btn", use_container_width=True, help="Ask Creative, Diverse and Lateral at once"):
+            st.session_state.thinking_mode = COMPARE_MODES if st.session_state.thinking_mode != COMPARE_MODES else None
 with col_empty:
-    pass
+    st.number_input("Ideas per turn", min_value=1, max_value=IDEA_COUNT_MAX, value=1, key="idea_count", help="Ask the selected thinking mode for several ideas at once")
 
 # Update button states
 st.markdown(f"""
@@ -428,21 +445,106 @@ st.markdown(f"""
     document.querySelector("button[kind='primary'][key='creative_btn']").setAttribute('data-selected', {str(creative_selected).lower()});
     document.querySelector("button[kind='primary'][key='diverse_btn']").setAttribute('data-selected', {str(diverse_selected).lower()});
     document.querySelector("button[kind='primary'][key='lateral_btn']").setAttribute('data-selected', {str(lateral_selected).lower()});
+    document.querySelector("button[kind='primary'][key='compare_btn']").setAttribute('data-selected', {str(compare_selected).lower()});
 </script>
 """, unsafe_allow_html=True)
 
 # Chat input
 user_input = st.chat_input("Type your message...")
+if not user_input and st.session_state.get("pending_input"):
+    user_input = st.session_state.pop("pending_input")
 
 if user_input:
+    st.session_state.history_window = HISTORY_WINDOW_MESSAGES
     st.session_state.chat_history.append({"role": "user", "content": user_input})
-    with st.spinner("Generating response..."):
-        ai_response = get_ai_response(user_input, st.session_state.thinking_mode, st.session_state.chat_history)
+    with st.chat_message("user"):
+        st.markdown(user_input)
+    if st.session_state.thinking_mode == COMPARE_MODES:
+        # Fan the question out to every thinking mode and show replies as they arrive
+        with st.spinner("Asking all thinking modes..."):
+            compare_start = time.perf_counter()
+            errors = []
+            compare_timings = []
+            for mode, ai_response, turn_timings in compare_thinking_modes(user_input, st.session_state.chat_history, st.session_state.document_summary, st.session_state.document_hash, st.session_state.cached_modes, st.session_state.conversation_memory):
+                compare_timings.append(turn_timings)
+                if turn_timings.get("error"):
+                    errors.append(turn_timings["error"])
+                with st.chat_message("assistant"):
+                    st.markdown(f'<div class="{mode.lower()}">', unsafe_allow_html=True)
+                    st.markdown(ai_response)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                    st.caption(format_timings(turn_timings))
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": ai_response,
+                    "thinking_mode": mode,
+                    "timings": turn_timings
+                })
+            compare_time = time.perf_counter() - compare_start
+            get_metrics().record("render", compare_time, mode=COMPARE_MODES, error=errors[0] if errors else None)
+            for turn_timings in compare_timings:
+                turn_timings["compare_time"] = compare_time
+        compact_session_history()
+        st.session_state.thinking_mode = None
+        st.rerun()
+    if st.session_state.thinking_mode in THINKING_MODES and st.session_state.idea_count > 1:
+        # Several ideas from one round of model calls, deduplicated and ranked locally
+        mode = st.session_state.thinking_mode
+        turn_timings = {"streamed": False}
+        ideas = []
+        render_start = time.perf_counter()
+        with st.chat_message("assistant"):
+            st.markdown(f'<div class="{mode.lower()}">', unsafe_allow_html=True)
+            with st.spinner(f"Generating {st.session_state.idea_count} ideas..."):
+                try:
+                    ideas = generate_ideas(user_input, mode, st.session_state.idea_count, st.session_state.chat_history, st.session_state.document_summary, st.session_state.document_hash, st.session_state.conversation_memory, turn_timings)
+                    ai_response = format_ideas(ideas)
+                except Exception as e:
+                    turn_timings["error"] = type(e).__name__
+                    ai_response = f"Error generating ideas: {str(e)}"
+            st.markdown(ai_response)
+            st.markdown('</div>', unsafe_allow_html=True)
+        get_metrics().record("render", time.perf_counter() - render_start, mode=f"{mode}Ideas", error=turn_timings.get("error"))
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": ai_response,
+            "thinking_mode": mode,
+            "ideas": [idea["text"] for idea in ideas],
+            "timings": turn_timings
+        })
+        compact_session_history()
+        st.session_state.thinking_mode = None
+        st.rerun()
+    turn_timings = {}
+    cached = lookup_cached_response(user_input, st.session_state.thinking_mode)
+    render_start = time.perf_counter()
+    with st.chat_message("assistant"):
+        if st.session_state.thinking_mode is not None:
+            st.markdown(f'<div class="{st.session_state.thinking_mode.lower()}">', unsafe_allow_html=True)
+        if cached is not None:
+            ai_response = cached["response"]
+            turn_timings = {"cached": True, "saved_time": cached["generation_time"]}
+            st.markdown(ai_response)
+        elif hasattr(st, "write_stream"):
+            ai_response = st.write_stream(stream_ai_response(user_input, st.session_state.thinking_mode, st.session_state.chat_history, turn_timings, st.session_state.document_summary, st.session_state.document_hash, st.session_state.conversation_memory))
+        else:
+            with st.spinner("Generating response..."):
+                ai_response = get_ai_response(user_input, st.session_state.thinking_mode, st.session_state.chat_history, st.session_state.document_summary, st.session_state.document_hash, turn_timings, st.session_state.conversation_memory)
+        if st.session_state.thinking_mode is not None:
+            st.markdown('</div>', unsafe_allow_html=True)
+    get_metrics().record(
+        "render", time.perf_counter() - render_start, mode=st.session_state.thinking_mode or "Conversational",
+        cache=cache_outcome(st.session_state.thinking_mode, cached), error=turn_timings.get("error")
+    )
+    if cached is None and not turn_timings.get("error"):
+        store_cached_response(user_input, st.session_state.thinking_mode, ai_response, turn_timings.get("total_time", 0.0))
     st.session_state.chat_history.append({
         "role": "assistant",
         "content": ai_response,
-        "thinking_mode": st.session_state.thinking_mode
+        "thinking_mode": st.session_state.thinking_mode,
+        "timings": turn_timings
     })
+    compact_session_history()
     st.session_state.thinking_mode = None
     st.rerun()
 